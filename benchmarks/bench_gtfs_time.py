@@ -0,0 +1,55 @@
+"""
+Row-wise vs vectorized GTFS time parsing over the full stop_times.txt.
+
+    PYTHONPATH=src python benchmarks/bench_gtfs_time.py
+"""
+import time
+
+import numpy as np
+
+from pulsetransit.dashboard.schedules import (
+    build_schedule_index,
+    load_stop_times,
+    parse_gtfs_time_column,
+    parse_gtfs_times,
+)
+
+
+# Row-wise parser as it was before vectorization, kept as the reference
+# for equivalence and speed
+
+def loop_parse_gtfs_time(time_str: str) -> int:
+    """Convert GTFS time string (HH:MM:SS, possibly >24h) to seconds since midnight."""
+    h, m, s = map(int, time_str.split(":"))
+    return h * 3600 + m * 60 + s
+
+
+def _timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+if __name__ == "__main__":
+    plain = load_stop_times()["departure_time"]
+    categorical = load_stop_times(categorical=True)["departure_time"]
+    print(f"stop_times.txt: {len(plain)} rows, {categorical.cat.categories.size} distinct times, "
+          f"{int((parse_gtfs_time_column(categorical) >= 86_400).sum())} past 24:00\n")
+
+    t_loop, expected = _timed(lambda: plain.apply(loop_parse_gtfs_time).to_numpy(), repeat=1)
+    cases = {
+        "vectorized": lambda: parse_gtfs_times(plain),
+        "categorical": lambda: parse_gtfs_time_column(categorical),
+    }
+    print(f"{'':<13}{'ms':>10}{'speedup':>9}")
+    print(f"{'apply':<13}{t_loop * 1000:>10.1f}{'1×':>9}")
+    for name, fn in cases.items():
+        t, actual = _timed(fn)
+        np.testing.assert_array_equal(expected, actual)
+        print(f"{name:<13}{t * 1000:>10.1f}{t_loop / t:>8.0f}×")
+
+    t_build, _ = _timed(build_schedule_index, repeat=1)
+    print(f"\nbuild_schedule_index: {t_build * 1000:.0f} ms")
@@ -0,0 +1,66 @@
+"""
+Journey planner latency over random origin/destination pairs.
+
+    PYTHONPATH=src python benchmarks/bench_planner.py [--queries 500] [--date 20251217]
+
+Needs stop_times.txt; when data/gtfs-static ships without it, runs on the
+suite's synthetic stop_times instead (see `suite.gtfs_feed`).
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+
+from pulsetransit.planner import build_timetable, format_seconds
+from suite import gtfs_feed
+
+
+def _busiest_date(timetable) -> int:
+    """Feed date with the most active services."""
+    dates = timetable.schedule.active_by_date
+    return max(dates, key=lambda d: len(dates[d]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--date", type=int, help="yyyymmdd (default: busiest feed date)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"GTFS feed: {gtfs_feed()}")
+    t0 = time.perf_counter()
+    timetable = build_timetable()
+    print(f"build_timetable: {len(timetable.dep)} connections, "
+          f"{sum(map(len, timetable.footpaths))} footpaths ({time.perf_counter() - t0:.2f}s)")
+
+    day = datetime.strptime(str(args.date or _busiest_date(timetable)), "%Y%m%d")
+    t0 = time.perf_counter()
+    timetable.day(day.date())
+    print(f"day timetable {day:%Y-%m-%d}: {(time.perf_counter() - t0) * 1000:.0f} ms (cached after)\n")
+
+    rng = random.Random(args.seed)
+    served = np.unique(np.concatenate((timetable.dep_stop, timetable.arr_stop)))
+    stop_ids = timetable.stop_ids[served].tolist()
+    latencies, found, transfers = [], 0, []
+    for _ in range(args.queries):
+        origin, destination = rng.sample(stop_ids, 2)
+        when = day.replace(hour=rng.randint(6, 22), minute=rng.randint(0, 59))
+        t0 = time.perf_counter()
+        journey = timetable.plan(origin, destination, when)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if journey is not None:
+            found += 1
+            transfers.append(journey.transfers)
+
+    ms = np.array(latencies)
+    print(f"{args.queries} queries, {found} journeys found, "
+          f"mean {np.mean(transfers) if transfers else 0:.2f} transfers")
+    print(f"{'':<6}{'ms':>8}")
+    for label, value in (("p50", np.percentile(ms, 50)), ("p95", np.percentile(ms, 95)),
+                         ("p99", np.percentile(ms, 99)), ("max", ms.max())):
+        print(f"{label:<6}{value:>8.2f}")
+    print(f"\nlast query: {origin} → {destination} at {when:%H:%M}"
+          + (f", arrive {format_seconds(journey.arrive)}" if journey else ", no journey"))
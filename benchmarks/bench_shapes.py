@@ -0,0 +1,154 @@
+"""
+Vectorized vs loop shape → polyline and arrow extraction on the real feed.
+
+    PYTHONPATH=src python benchmarks/bench_shapes.py
+"""
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from pulsetransit.cfg.config import LANG
+from pulsetransit.dashboard.map import (
+    _build_shape_colors,
+    _extract_arrow_points,
+    _shapes_to_lines_colored,
+    load_routes,
+    load_shapes,
+    load_trips,
+)
+
+
+# Loop implementations as they were before vectorization, kept as the
+# reference for equivalence and speed
+
+def loop_shapes_to_lines_colored(
+    shapes: pd.DataFrame,
+    shape_colors: dict,
+    lang_code: str,
+) -> list[dict]:
+    """One trace per route, with None separators within each."""
+    route_groups: dict[str, dict] = {}
+    t = LANG[lang_code]
+
+    for shape_id, group in shapes.groupby("shape_id", sort=False):
+        info = shape_colors.get(shape_id)
+        if info is None:
+            continue
+
+        color = info["color"]
+        name = info["route_short_name"]
+        if name == "99": continue # remove 99 lanzadera from list
+        # Group by route NAME (not color)
+        if name not in route_groups:
+            route_groups[name] = {
+                "name": f"{t['line']} {name}",
+                "color": color,
+                "lats": [],
+                "lons": []
+            }
+
+        pts = group.sort_values("shape_pt_sequence")
+        route_groups[name]["lats"].extend(pts["shape_pt_lat"].tolist() + [None])
+        route_groups[name]["lons"].extend(pts["shape_pt_lon"].tolist() + [None])
+
+    # Sort: LC first, then by route number
+    def sort_key(item):
+        name_key, data = item
+
+        if name_key == "LC":
+            return (0, 0, "")
+
+        if name_key[0].isdigit():
+            num_part = ""
+            for char in name_key:
+                if char.isdigit():
+                    num_part += char
+                else:
+                    break
+
+            if num_part == name_key:
+                return (1, int(num_part), "")
+            else:
+                suffix = name_key[len(num_part):]
+                return (1, int(num_part), suffix)
+
+        return (2, 0, name_key)
+
+    sorted_groups = sorted(route_groups.items(), key=sort_key)
+
+    return [{"color": v["color"], "name": v["name"], "lats": v["lats"], "lons": v["lons"]} for k, v in sorted_groups]
+
+def loop_extract_arrow_points(shapes: pd.DataFrame, shape_colors: dict, interval: int = 15) -> list[dict]:
+    """Extract evenly-spaced arrow markers along each shape."""
+    arrows = []
+    for shape_id, group in shapes.groupby("shape_id", sort=False):
+        info = shape_colors.get(shape_id, {"route_short_name": "?", "color": "#888888"})
+        pts = group.sort_values("shape_pt_sequence")
+
+        # Sample every Nth point for arrows
+        sampled = pts.iloc[::interval]
+        if len(sampled) < 2:
+            continue
+
+        # Calculate bearing from current point to next point
+        lats, lons, angles = [], [], []
+        for i in range(len(sampled) - 1):
+            lat1, lon1 = sampled.iloc[i][["shape_pt_lat", "shape_pt_lon"]]
+            lat2, lon2 = sampled.iloc[i+1][["shape_pt_lat", "shape_pt_lon"]]
+
+            # Simple angle calculation (good enough for small distances)
+            dlat = lat2 - lat1
+            dlon = lon2 - lon1
+            angle = math.degrees(math.atan2(dlon, dlat))
+
+            lats.append(lat1)
+            lons.append(lon1)
+            angles.append(angle)
+
+        arrows.append({
+            "lats": lats,
+            "lons": lons,
+            "angles": angles,
+            "color": info["color"],
+            "name": info["route_short_name"],
+        })
+    return arrows
+
+def _timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _flat(values):
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+if __name__ == "__main__":
+    shapes, trips, routes = load_shapes(), load_trips(), load_routes()
+    colors = _build_shape_colors(trips, routes)
+    print(f"shapes.txt: {len(shapes)} points, {shapes['shape_id'].nunique()} shapes\n")
+
+    cases = {
+        "lines": (lambda: loop_shapes_to_lines_colored(shapes, colors, "es"),
+                  lambda: _shapes_to_lines_colored(shapes, colors, "es")),
+        "arrows": (lambda: loop_extract_arrow_points(shapes, colors),
+                   lambda: _extract_arrow_points(shapes, colors)),
+    }
+    print(f"{'':<8}{'loop (ms)':>12}{'numpy (ms)':>12}{'speedup':>9}")
+    for name, (loop, vectorized) in cases.items():
+        t_loop, expected = _timed(loop, repeat=1 if name == "arrows" else 5)
+        t_vec, actual = _timed(vectorized)
+        assert len(expected) == len(actual), name
+        for e, a in zip(expected, actual):
+            for key in e:
+                if key in ("lats", "lons", "angles"):
+                    np.testing.assert_allclose(_flat(e[key]), np.asarray(a[key], dtype=float))
+                else:
+                    assert e[key] == a[key], (name, key)
+        print(f"{name:<8}{t_loop * 1000:>12.1f}{t_vec * 1000:>12.1f}{t_loop / t_vec:>8.0f}×")
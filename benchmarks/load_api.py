@@ -0,0 +1,136 @@
+"""
+Load test for the HTTP API: keep-alive clients hammering a mix of
+endpoints over random stops, reporting throughput and latency.
+
+    PYTHONPATH=src python benchmarks/load_api.py                 # starts a server
+    PYTHONPATH=src python benchmarks/load_api.py --url http://127.0.0.1:8080
+
+Without --url the server runs in a subprocess, so it does not share a
+GIL with the clients.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+from pulsetransit.gtfs_cache import load_table
+
+# Endpoint mix: (weight, path template)
+MIX = [
+    (5, "/departures?stop={stop}&limit=10"),
+    (4, "/arrivals?stop={stop}&limit=10"),
+    (1, "/search?q={name}&limit=8"),
+]
+
+
+def _start_server(port: int) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "pulsetransit.api", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("API server did not come up")
+
+
+def _client(host, port, paths, stop_at, latencies, errors, seed):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    while time.perf_counter() < stop_at:
+        path = rng.choice(paths)
+        t0 = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def _get_json(host, port, path):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.request("GET", path)
+    return json.loads(conn.getresponse().read())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="API to test (default: start one locally)")
+    parser.add_argument("--port", type=int, default=8765, help="port for the local server")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--stops", type=int, default=200, help="distinct stops queried")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        host, port = urlsplit(args.url).hostname, urlsplit(args.url).port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        t0 = time.perf_counter()
+        server = _start_server(port)
+        print(f"server up in {time.perf_counter() - t0:.1f}s")
+
+    rng = random.Random(0)
+    stops = load_table("stops")
+    sample = stops.sample(min(args.stops, len(stops)), random_state=0)
+    paths = []
+    for weight, template in MIX:
+        for stop, name in zip(sample["stop_id"], sample["stop_name"]):
+            word = rng.choice(str(name).split() or ["a"])
+            paths += [template.format(stop=stop, name=quote(word[:rng.randint(3, 8)]))] * weight
+
+    try:
+        before = _get_json(host, port, "/health")
+        latencies: list[float] = []
+        errors: list = []
+        stop_at = time.perf_counter() + args.seconds
+        threads = [
+            threading.Thread(target=_client,
+                             args=(host, port, paths, stop_at, latencies, errors, seed))
+            for seed in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        after = _get_json(host, port, "/health")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    ms = np.array(latencies) * 1000
+    hits = after["cache"]["hits"] - before["cache"]["hits"]
+    misses = after["cache"]["misses"] - before["cache"]["misses"]
+    print(f"{args.clients} clients × {args.seconds:g}s over {len(sample)} stops: "
+          f"{len(ms)} requests, {len(ms) / args.seconds:.0f} req/s, {len(errors)} errors")
+    if len(ms):
+        print(f"latency ms: p50 {np.percentile(ms, 50):.2f}  p95 {np.percentile(ms, 95):.2f}  "
+              f"p99 {np.percentile(ms, 99):.2f}  max {ms.max():.2f}")
+    if hits + misses:
+        print(f"response cache: {hits / (hits + misses):.1%} hits ({misses} builds)")
@@ -0,0 +1,508 @@
+"""
+Benchmark suite: latency and peak memory of the hot paths, comparable
+run to run.
+
+    PYTHONPATH=src python benchmarks/suite.py                       # everything
+    PYTHONPATH=src python benchmarks/suite.py -k departures -k map  # name filters
+    PYTHONPATH=src python benchmarks/suite.py --save before.json
+    PYTHONPATH=src python benchmarks/suite.py --compare before.json
+
+Each case is timed over several repeats (min and median reported), then
+run once more under tracemalloc for its peak Python/numpy allocation.
+Fixtures are built outside the timed region:
+
+- collector: synthetic estimaciones/posiciones payloads in the open-data
+  API's JSON layout, served over local HTTP so `collect_*` runs its real
+  fetch, stream-parse and insert path into a fresh in-memory database
+- schedule/map/planner: the GTFS feed in data/gtfs-static. The published
+  feed ships without stop_times.txt; in that case the suite runs on a
+  copy of it with synthetic stop_times of the same size (every trip
+  calls at the stops along its shape), and says so in the header
+- validate: SQLite files grown to each of `--db-rows` rows per table
+
+The single-purpose scripts next to this one (bench_gtfs_time, bench_shapes,
+bench_planner, load_api) compare implementations or load-test the API;
+this suite tracks the current code over time.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+DB_ROWS = (10_000, 100_000, 1_000_000)
+API_ROWS = 5000
+# Synthetic stop_times: stops this close to a trip's shape are served
+STOP_RADIUS_M = 25
+BUS_SPEED_MS = 5.5
+DWELL_S = 20
+
+
+class Skip(Exception):
+    """Raised by a fixture when the case cannot run here."""
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable[[Any], Any]
+    setup: Callable[[], Any] = lambda: None   # per repeat, not timed
+    repeat: int = 5
+
+
+CASES: list[Case] = []
+
+
+def case(name: str, setup: Callable[[], Any] = lambda: None, repeat: int = 5):
+    def register(fn):
+        CASES.append(Case(name, fn, setup, repeat))
+        return fn
+    return register
+
+
+@contextlib.contextmanager
+def _quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# Fixtures ------------------------------------------------------------------
+
+def _estimacion(rng: random.Random, now: datetime, i: int) -> dict:
+    return {
+        "ayto:paradaId": rng.randint(1, 500),
+        "ayto:etiqLinea": rng.choice(["1", "2", "3", "4", "5C1", "7C2", "13", "LC"]),
+        "ayto:fechActual": (now - timedelta(seconds=rng.randint(0, 120))).isoformat(),
+        "ayto:tiempo1": rng.randint(0, 1800),
+        "ayto:tiempo2": rng.randint(600, 3600),
+        "ayto:distancia1": rng.randint(0, 8000),
+        "ayto:distancia2": rng.randint(1000, 15000),
+        "ayto:destino1": "INTERCAMBIADOR SARDINERO",
+        "ayto:destino2": "PLAZA ESTACIONES",
+        "dc:identifier": str(i),
+        "uri": f"http://datos.santander.es/api/rest/datasets/control_flotas_estimaciones/{i}.json",
+    }
+
+
+def _posicion(rng: random.Random, now: datetime, i: int) -> dict:
+    return {
+        "ayto:instante": (now - timedelta(seconds=30 * (i // 150))).isoformat(),
+        "ayto:vehiculo": 100 + i % 150,
+        "ayto:linea": rng.choice([1, 2, 3, 4, 11, 13, 17]),
+        "wgs84_pos:lat": 43.46 + rng.uniform(-0.03, 0.03),
+        "wgs84_pos:long": -3.81 + rng.uniform(-0.05, 0.05),
+        "ayto:velocidad": rng.randint(0, 50),
+        "ayto:estado": 1,
+        "dc:identifier": str(i),
+    }
+
+
+@lru_cache(maxsize=None)
+def api_payloads(rows: int = API_ROWS) -> dict[str, bytes]:
+    """Encoded API documents per dataset, `rows` resources each."""
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    make = {"control_flotas_estimaciones": _estimacion, "control_flotas_posiciones": _posicion}
+    return {
+        dataset: json.dumps({
+            "summary": {"items": rows, "items_per_page": rows, "pages": 1, "current_page": 1},
+            "resources": [fn(rng, now, i) for i in range(rows)],
+        }).encode("utf-8")
+        for dataset, fn in make.items()
+    }
+
+
+@lru_cache(maxsize=1)
+def payload_server() -> str:
+    """Local stand-in for the open-data API; returns its host:port."""
+    payloads = api_payloads()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            dataset = self.path.split("/datasets/")[-1].split(".json")[0]
+            body = payloads.get(dataset)
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"127.0.0.1:{server.server_port}"
+
+
+def collector_db():
+    """Fresh in-memory database, with the collector pointed at the local API."""
+    from pulsetransit import collector
+    from pulsetransit.db import init_db
+    collector.API_HOST = payload_server()
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    return conn
+
+
+_tmp = tempfile.TemporaryDirectory(prefix="pulsetransit-bench-")
+
+
+@lru_cache(maxsize=None)
+def growth_db(rows: int) -> Path:
+    """SQLite file with `rows` estimaciones and posiciones, as the collector leaves it."""
+    from pulsetransit.db import init_db
+    path = Path(_tmp.name) / f"tus_{rows}.db"
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    stamps = [(start + timedelta(seconds=2 * i)).isoformat() for i in range(rows)]
+    with conn:
+        conn.executemany(
+            "INSERT INTO estimaciones (collected_at, parada_id, linea, fech_actual, tiempo1, "
+            "predicted_arrival) VALUES (?, ?, ?, ?, ?, ?)",
+            ((t, i % 500, str(i % 20), t, 300, t) for i, t in enumerate(stamps)),
+        )
+        conn.executemany(
+            "INSERT INTO posiciones (collected_at, instante, vehiculo, linea, lat, lon) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((t, t, i % 150, i % 20, 43.46, -3.81) for i, t in enumerate(stamps)),
+        )
+        # What the collector's record_ingest would have left behind
+        conn.execute("DELETE FROM ingest_meta")
+        for table, col in (("estimaciones", "collected_at"), ("posiciones", "instante")):
+            conn.execute(
+                f"INSERT INTO ingest_meta (dataset, row_count, last_time) "
+                f"SELECT ?, COUNT(*), MAX({col}) FROM {table}", (table,)
+            )
+    conn.close()
+    return path
+
+
+def synthetic_stop_times(gtfs_dir: Path) -> pd.DataFrame:
+    """
+    stop_times for every trip in `gtfs_dir`: the stops within
+    `STOP_RADIUS_M` of the trip's shape, in shape order, timed at
+    `BUS_SPEED_MS` plus `DWELL_S` per stop. Trips of each route, direction
+    and service are spread from 06:00 to 24:30, so some run past 24:00.
+    """
+    stops = pd.read_csv(gtfs_dir / "stops.txt")
+    shapes = pd.read_csv(gtfs_dir / "shapes.txt").sort_values(["shape_id", "shape_pt_sequence"])
+    trips = pd.read_csv(gtfs_dir / "trips.txt", dtype=str)
+
+    lat0 = np.radians(stops["stop_lat"].mean())
+
+    def xy(lat, lon):
+        return np.column_stack((np.radians(lon) * np.cos(lat0), np.radians(lat))) * 6_371_000
+
+    stop_xy = xy(stops["stop_lat"].to_numpy(), stops["stop_lon"].to_numpy())
+    stop_ids = stops["stop_id"].to_numpy()
+    patterns = []
+    for shape_id, points in shapes.groupby("shape_id", sort=False):
+        pts = xy(points["shape_pt_lat"].to_numpy(), points["shape_pt_lon"].to_numpy())
+        along = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(pts, axis=0).T))))
+        dist = np.hypot(*(stop_xy[:, None, :] - pts[None, :, :]).transpose(2, 0, 1))
+        nearest = dist.argmin(axis=1)
+        served = np.flatnonzero(dist[np.arange(len(stop_xy)), nearest] <= STOP_RADIUS_M)
+        served = served[np.argsort(nearest[served], kind="stable")]
+        if len(served) < 2:
+            continue
+        patterns.append(pd.DataFrame({
+            "shape_id": shape_id,
+            "stop_id": stop_ids[served],
+            "stop_sequence": np.arange(1, len(served) + 1),
+            "offset": (along[nearest[served]] / BUS_SPEED_MS
+                       + DWELL_S * np.arange(len(served))).astype(int),
+        }))
+
+    group = trips.groupby(["route_id", "direction_id", "service_id"], dropna=False)
+    slot = group.cumcount() / group["trip_id"].transform("size")
+    trips = trips.assign(start=(6 * 3600 + slot * 18.5 * 3600).astype(int))
+    rows = trips[["trip_id", "shape_id", "start"]].merge(pd.concat(patterns), on="shape_id")
+    seconds = rows["start"] + rows["offset"]
+    times = ((seconds // 3600).astype(str).str.zfill(2) + ":"
+             + (seconds // 60 % 60).astype(str).str.zfill(2) + ":"
+             + (seconds % 60).astype(str).str.zfill(2))
+    return pd.DataFrame({
+        "trip_id": rows["trip_id"],
+        "arrival_time": times,
+        "departure_time": times,
+        "stop_id": rows["stop_id"],
+        "stop_sequence": rows["stop_sequence"],
+    })
+
+
+@lru_cache(maxsize=1)
+def gtfs_feed() -> str:
+    """
+    Point the GTFS cases at a complete feed; returns how it was made.
+
+    GTFS_DIR is relative to the working directory, so for a feed without
+    stop_times.txt the suite copies it into its temporary directory, adds
+    synthetic stop_times there and changes into that directory.
+    """
+    from pulsetransit.gtfs_cache import GTFS_DIR
+    if not GTFS_DIR.is_dir() or (GTFS_DIR / "stop_times.txt").exists():
+        return "published"
+    root = Path(_tmp.name) / "feed"
+    feed_dir = root / GTFS_DIR
+    feed_dir.mkdir(parents=True)
+    for path in GTFS_DIR.glob("*.txt"):
+        shutil.copy2(path, feed_dir)
+    synthetic_stop_times(GTFS_DIR).to_csv(feed_dir / "stop_times.txt", index=False)
+    os.chdir(root)
+    return "synthetic stop_times"
+
+
+def gtfs(table: str = "stop_times"):
+    from pulsetransit.gtfs_cache import load_table
+    gtfs_feed()
+    try:
+        load_table(table)
+    except FileNotFoundError as e:
+        raise Skip(f"GTFS feed has no {Path(str(e)).name}") from None
+
+
+@lru_cache(maxsize=1)
+def query_stops(n: int = 200) -> list[int]:
+    from pulsetransit.gtfs_cache import load_table
+    ids = load_table("stops")["stop_id"].tolist()
+    return random.Random(0).sample(ids, min(n, len(ids)))
+
+
+@lru_cache(maxsize=1)
+def busiest_day() -> datetime:
+    """8:00 on the feed date with the most active services."""
+    from pulsetransit.dashboard.schedules import get_schedule_index
+    dates = get_schedule_index().active_by_date
+    day = max(dates, key=lambda d: len(dates[d]))
+    return datetime.strptime(str(day), "%Y%m%d").replace(hour=8)
+
+
+# Cases ---------------------------------------------------------------------
+
+@case("collector.collect_estimaciones", setup=collector_db)
+def _(conn):
+    from pulsetransit.collector import collect_estimaciones
+    with _quiet():
+        collect_estimaciones(conn)
+
+
+@case("collector.collect_posiciones", setup=collector_db)
+def _(conn):
+    from pulsetransit.collector import collect_posiciones
+    with _quiet():
+        collect_posiciones(conn)
+
+
+@case("schedules.build_schedule_index", setup=gtfs, repeat=3)
+def _(_):
+    from pulsetransit.dashboard.schedules import build_schedule_index
+    build_schedule_index()
+
+
+def _warm_schedule():
+    gtfs()
+    from pulsetransit.dashboard.schedules import get_schedule_index
+    get_schedule_index().next_departures(query_stops()[0], busiest_day(), 10)
+
+
+@case("schedules.get_next_departures ×200 stops", setup=_warm_schedule)
+def _(_):
+    from pulsetransit.dashboard.schedules import get_next_departures
+    when = busiest_day()
+    for stop_id in query_stops():
+        get_next_departures(stop_id, when, limit=10)
+
+
+@case("schedules.get_departure_board (all stops)", setup=_warm_schedule)
+def _(_):
+    from pulsetransit.dashboard.schedules import get_departure_board
+    get_departure_board(busiest_day())
+
+
+def _map_tables():
+    gtfs("shapes")
+    from pulsetransit.dashboard.map import load_routes, load_shapes, load_stops, load_trips
+    return load_stops(), load_shapes(), load_trips(), load_routes()
+
+
+@case("map.build_map (full geometry)", setup=_map_tables, repeat=3)
+def _(tables):
+    from pulsetransit.dashboard.map import build_map
+    stops, shapes, trips, routes = tables
+    build_map(stops, shapes, trips, routes)
+
+
+def _warm_map():
+    stops = _map_tables()[0]
+    from pulsetransit.dashboard.map import build_cached_map
+    build_cached_map(stops)
+    build_cached_map(stops, highlight_stop_id=int(stops["stop_id"].iloc[0]))
+    return stops
+
+
+@case("map.build_cached_map (warm, highlighted)", setup=_warm_map)
+def _(stops):
+    from pulsetransit.dashboard.map import build_cached_map
+    build_cached_map(stops, highlight_stop_id=int(stops["stop_id"].iloc[0]))
+
+
+def _warm_planner():
+    gtfs()
+    from pulsetransit.planner import get_timetable
+    timetable = get_timetable()
+    timetable.day(busiest_day().date())
+    return timetable
+
+
+@case("planner.plan ×50 O/D", setup=_warm_planner)
+def _(timetable):
+    rng = random.Random(1)
+    stops = query_stops()
+    when = busiest_day()
+    for _ in range(50):
+        origin, destination = rng.sample(stops, 2)
+        timetable.plan(origin, destination, when.replace(hour=rng.randint(6, 21)))
+
+
+def _validate_case(rows: int, check: str):
+    def setup():
+        return sqlite3.connect(growth_db(rows))
+
+    def run(conn):
+        from pulsetransit import validate
+        with _quiet():
+            getattr(validate, check)(conn, "estimaciones", "collected_at")
+            getattr(validate, check)(conn, "posiciones", "instante")
+
+    return setup, run
+
+
+def register_validate(db_rows):
+    for rows in db_rows:
+        for check in ("check_table", "check_meta"):
+            setup, run = _validate_case(rows, check)
+            CASES.append(Case(f"validate.{check} ({rows:,} rows)", run, setup))
+
+
+# Runner --------------------------------------------------------------------
+
+def measure(c: Case) -> dict:
+    times = []
+    for _ in range(c.repeat):
+        ctx = c.setup()
+        t0 = time.perf_counter()
+        c.run(ctx)
+        times.append(time.perf_counter() - t0)
+    ctx = c.setup()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        c.run(ctx)
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_ms": min(times) * 1000,
+        "median_ms": statistics.median(times) * 1000,
+        "repeat": c.repeat,
+        "peak_kib": peak / 1024,
+    }
+
+
+def environment() -> dict:
+    from pulsetransit.gtfs_cache import feed_hash
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except OSError:
+        commit = ""
+    try:
+        feed = feed_hash()
+    except OSError:
+        feed = ""
+    return {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "feed": feed,
+        "stop_times": gtfs_feed(),
+    }
+
+
+def _ratio(new: float, old: float | None) -> str:
+    return f"{new / old:>7.2f}×" if old else f"{'':>8}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", action="append", default=[], metavar="TEXT",
+                        help="only cases whose name contains TEXT (repeatable)")
+    parser.add_argument("--db-rows", type=int, nargs="+", default=list(DB_ROWS),
+                        help="table sizes for the validate fixtures")
+    parser.add_argument("--save", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON from an earlier --save")
+    args = parser.parse_args()
+
+    register_validate(args.db_rows)
+    selected = [c for c in CASES if not args.k or any(k in c.name for k in args.k)]
+    previous = json.loads(args.compare.read_text())["results"] if args.compare else {}
+
+    # Before anything loads the feed, which may switch to the synthetic copy
+    # (and change directory)
+    save = args.save and args.save.resolve()
+    gtfs_feed()
+    env = environment()
+    print(f"commit {env['commit'] or '?'} · python {env['python']} · numpy {env['numpy']} · "
+          f"pandas {env['pandas']} · feed {env['feed'] or '?'} ({env['stop_times']})\n")
+    header = f"{'case':<48}{'min ms':>10}{'median ms':>11}{'peak KiB':>11}"
+    if previous:
+        header += f"{'time':>9}{'memory':>9}"
+    print(header)
+
+    results = {}
+    for c in selected:
+        try:
+            r = measure(c)
+        except Skip as e:
+            print(f"{c.name:<48}  skipped: {e}")
+            continue
+        results[c.name] = r
+        line = f"{c.name:<48}{r['min_ms']:>10.2f}{r['median_ms']:>11.2f}{r['peak_kib']:>11.0f}"
+        if previous:
+            old = previous.get(c.name, {})
+            line += _ratio(r["min_ms"], old.get("min_ms")) + _ratio(r["peak_kib"], old.get("peak_kib"))
+        print(line, flush=True)
+
+    if save:
+        save.write_text(json.dumps({"environment": env, "results": results}, indent=2))
+        print(f"\nsaved to {args.save}")
@@ -0,0 +1,235 @@
+# src/pulsetransit/api.py
+"""
+Read-only HTTP/JSON API over the preloaded GTFS and database indexes.
+
+    python -m pulsetransit.api --port 8080
+
+    GET /departures?stop=42&limit=10    scheduled departures
+    GET /arrivals?stop=42&limit=10      live ETAs merged with the schedule
+    GET /search?q=valdecilla&limit=10   stop search
+    GET /health                         feed, cache and refresher stats
+
+Stdlib only: a threading HTTP/1.1 server with keep-alive. The schedule
+has minute resolution, so departure and arrival responses are cached as
+encoded JSON per (stop, limit, minute) and the whole cache is dropped
+when the minute turns. Arrivals are also keyed by the real-time
+high-water mark, so freshly loaded predictions are served straight away.
+"""
+import json
+import threading
+import time
+import traceback
+from datetime import datetime
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from zoneinfo import ZoneInfo
+
+from pulsetransit.dashboard.schedules import get_schedule_index
+from pulsetransit.gtfs_cache import feed_hash, load_table
+from pulsetransit.realtime import get_realtime_arrivals
+from pulsetransit.search import get_stop_search_index, normalise
+
+TZ = ZoneInfo("Europe/Madrid")
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+class UnknownStop(LookupError):
+    """A request named a stop_id that is not in the feed (404)."""
+
+
+class MinuteCache:
+    """Encoded responses of the current minute; a new minute starts empty."""
+
+    def __init__(self):
+        self.minute: datetime | None = None
+        self._entries: dict[tuple, bytes] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, minute: datetime, key: tuple, build) -> bytes:
+        if minute != self.minute:
+            with self._lock:
+                if minute != self.minute:
+                    self._entries = {}
+                    self.minute = minute
+        entries = self._entries
+        body = entries.get(key)
+        if body is None:
+            self.misses += 1
+            body = entries[key] = build()
+        else:
+            self.hits += 1
+        return body
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _int_param(params: dict, name: str, default: int | None = None,
+               low: int | None = None, high: int | None = None) -> int:
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise ValueError(f"missing parameter '{name}'")
+        return default
+    try:
+        value = int(values[0])
+    except ValueError:
+        raise ValueError(f"parameter '{name}' must be an integer") from None
+    if low is not None:
+        value = max(value, low)
+    if high is not None:
+        value = min(value, high)
+    return value
+
+
+class TransitApi:
+    """Endpoint logic; each method returns an encoded JSON body."""
+
+    def __init__(self):
+        stops = load_table("stops")
+        self.stop_names = dict(zip(stops["stop_id"].tolist(), stops["stop_name"].tolist()))
+        self.cache = MinuteCache()
+        self.realtime = get_realtime_arrivals()
+        self._search = lru_cache(maxsize=4096)(self._search_body)
+        self.started = time.time()
+        # Build the shared indexes now rather than on the first request
+        get_schedule_index()
+        get_stop_search_index()
+
+    def _stop(self, params: dict) -> int:
+        stop_id = _int_param(params, "stop")
+        if stop_id not in self.stop_names:
+            raise UnknownStop(f"unknown stop {stop_id}")
+        return stop_id
+
+    def _board(self, stop_id: int, now: datetime, departures) -> bytes:
+        return _encode({
+            "stop_id": stop_id,
+            "stop_name": self.stop_names[stop_id],
+            "at": now.isoformat(timespec="seconds"),
+            "departures": departures.to_dict("records"),
+        })
+
+    def departures(self, params: dict) -> bytes:
+        stop_id = self._stop(params)
+        limit = _int_param(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        now = datetime.now(TZ).replace(second=0, microsecond=0)
+        return self.cache.get(now, ("departures", stop_id, limit), lambda: self._board(
+            stop_id, now, get_schedule_index().next_departures(stop_id, now, limit)))
+
+    def arrivals(self, params: dict) -> bytes:
+        stop_id = self._stop(params)
+        limit = _int_param(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        now = datetime.now(TZ).replace(second=0, microsecond=0)
+        key = ("arrivals", stop_id, limit, self.realtime.high_water)
+        return self.cache.get(now, key, lambda: self._board(
+            stop_id, now, self.realtime.stop_arrivals(stop_id, now, limit)))
+
+    def _search_body(self, feed: str, query: str, limit: int) -> bytes:
+        matches = get_stop_search_index().search(query, limit)
+        return _encode({
+            "query": query,
+            "matches": [
+                {"stop_id": m.stop_id, "stop_name": m.stop_name, "score": m.score}
+                for m in matches
+            ],
+        })
+
+    def search(self, params: dict) -> bytes:
+        query = normalise((params.get("q") or [""])[0])
+        if not query:
+            raise ValueError("missing parameter 'q'")
+        limit = _int_param(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        return self._search(feed_hash(), query, limit)
+
+    def health(self, params: dict) -> bytes:
+        info = self._search.cache_info()
+        return _encode({
+            "status": "ok",
+            "feed": feed_hash(),
+            "uptime_s": round(time.time() - self.started),
+            "cache": {"entries": len(self.cache), "hits": self.cache.hits,
+                      "misses": self.cache.misses},
+            "search_cache": {"hits": info.hits, "misses": info.misses},
+            "realtime_high_water": self.realtime.high_water,
+        })
+
+
+ROUTES = {
+    "/departures": TransitApi.departures,
+    "/arrivals": TransitApi.arrivals,
+    "/search": TransitApi.search,
+    "/health": TransitApi.health,
+}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients reuse connections
+    server_version = "pulsetransit"
+    # Headers and body are separate writes; with Nagle on, keep-alive
+    # responses stall ~40 ms waiting for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = ROUTES.get(url.path)
+        if route is None:
+            return self._send(404, _encode({"error": f"no such endpoint {url.path}"}))
+        try:
+            self._send(200, route(self.server.api, parse_qs(url.query)))
+        except ValueError as e:
+            self._send(400, _encode({"error": str(e)}))
+        except UnknownStop as e:
+            self._send(404, _encode({"error": str(e)}))
+        except Exception:
+            # A bug, not a bad request: report it whatever the verbosity
+            print(f"{self.requestline!r} failed:")
+            traceback.print_exc()
+            self._send(500, _encode({"error": "internal error"}))
+
+    def _send(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, api: TransitApi | None = None, verbose: bool = False):
+        self.api = api or TransitApi()
+        self.verbose = verbose
+        super().__init__(address, ApiHandler)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    server = ApiServer((args.host, args.port), verbose=args.verbose)
+    print(f"Indexes loaded in {time.perf_counter() - t0:.1f}s; "
+          f"serving on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
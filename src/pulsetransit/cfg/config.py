@@ -7,7 +7,8 @@ LANG = {
         "search_stop": "Search stop",
         "search_placeholder": "Type stop ID or name to search...",
         "click_info": "Click a stop on the map or use the search bar",
-        "scheduled_departures": "Scheduled Departures",
+        "no_matches": "No stops match your search.",
+        "scheduled_departures": "Next Departures",
         "no_departures": "No upcoming departures found for this stop.",
         "line": "Line",
         "destination": "Destination",
@@ -18,9 +19,20 @@ LANG = {
         "plan_trip": "Plan Your Trip",
         "query_time": "Query time",
         "query_time_help": "Show schedules for this time of day",
-        "coming_soon": " COMING SOON: \n - 📍 Live bus positions, \n - ⏱️ Real-time arrival predictions (estimaciones), and \n3) 💻 ML-enhanced predictions (currently collecting training data)",
+        "from": "From",
+        "to": "To",
+        "depart": "Departs",
+        "arrive": "Arrives",
+        "arrive_at": "Arrive at",
+        "transfers": "transfers",
+        "walk": "Walk",
+        "no_journey": "No journey found within the next 3 hours.",
         "stops":"Stops",
-        "selected_stop": "Selected Stop"
+        "selected_stop": "Selected Stop",
+        "live_buses": "Live buses",
+        "bus": "bus",
+        "no_live_buses": "No live bus positions in the local database yet.",
+        "realtime_legend": "📡 Real-time prediction; other times are scheduled."
     },
     "es": {
         "title": "TUS Santander Tracker",
@@ -30,6 +42,7 @@ LANG = {
         "search_stop": "Buscar parada",
         "search_placeholder": "Escribe el nombre o el número de parada...",
         "click_info": "Pulsa en una parada del mapa o usa el buscador",
+        "no_matches": "Ninguna parada coincide con la búsqueda.",
         "scheduled_departures": "Próximas Salidas",
         "no_departures": "No se encontraron salidas próximas para esta parada.",
         "line": "Línea",
@@ -41,9 +54,20 @@ LANG = {
         "plan_trip": "Planifica tu Viaje",
         "query_time": "Hora de consulta",
         "query_time_help": "Mostrar horarios para esta hora del día",
-        "coming_soon": " PRÓXIMAMENTE:\n - 📍 Posiciones en vivo de autobuses, \n - ⏱️ Predicciones de llegada en tiempo real (estimaciones), \n - 💻 Predicciones mejoradas con ML (actualmente recopilando datos de entrenamiento)",
+        "from": "Desde",
+        "to": "Hasta",
+        "depart": "Sale",
+        "arrive": "Llega",
+        "arrive_at": "Llegada a las",
+        "transfers": "transbordos",
+        "walk": "A pie",
+        "no_journey": "No hay trayecto en las próximas 3 horas.",
         "stops":"Paradas",
-        "selected_stop": "Parada Seleccionada"
+        "selected_stop": "Parada Seleccionada",
+        "live_buses": "Autobuses en vivo",
+        "bus": "autobús",
+        "no_live_buses": "Aún no hay posiciones de autobuses en la base de datos local.",
+        "realtime_legend": "📡 Predicción en tiempo real; el resto son horarios programados."
    
     }
 }
\ No newline at end of file
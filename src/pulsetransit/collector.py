@@ -1,87 +1,401 @@
 # collector.py
+import codecs
+import hashlib
+import itertools
+import re
+import urllib.error
 import urllib.request
 import json
-from datetime import datetime, timezone
-from pulsetransit.db import get_connection, init_db
+import time
+from datetime import datetime, timezone, timedelta
+from pulsetransit.db import count_inserted, get_connection, init_db, record_ingest
 
 
+API_HOST = "datos.santander.es"
+
+# Seconds between pulls, as on the Cloudflare worker's cron
+ESTIMACIONES_INTERVAL_S = 120
+POSICIONES_INTERVAL_S = 3600
+
+
+def dataset_path(dataset, rows=5000):
+    return f"/api/rest/datasets/{dataset}.json?rows={rows}"
+
 def fetch_json(dataset, rows=5000):
-    url = f"http://datos.santander.es/api/rest/datasets/{dataset}.json?rows={rows}"
+    url = f"http://{API_HOST}{dataset_path(dataset, rows)}"
     with urllib.request.urlopen(url, timeout=30) as r:
         return json.loads(r.read()).get("resources", [])
 
-def collect_estimaciones(conn):
-    collected_at = datetime.now(timezone.utc).isoformat()
-    rows = fetch_json("control_flotas_estimaciones")
-    inserted = 0
-    for item in rows:
-        fech_actual = item.get("ayto:fechActual")
-        tiempo1 = item.get("ayto:tiempo1")
-        # Compute predicted arrival = fechActual + tiempo1 seconds
-        predicted_arrival = None
-        if fech_actual and tiempo1 is not None:
+def fetch_resources(dataset, rows=5000, delta=None):
+    """
+    Like `fetch_json`, but yields resources as they come off the socket.
+
+    With a `DeltaFilter`, the request is conditional on its stored
+    validators and yields nothing if the server answers 304.
+    """
+    url = f"http://{API_HOST}{dataset_path(dataset, rows)}"
+    headers = delta.request_headers() if delta else {}
+    try:
+        r = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30)
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and delta:
+            delta.not_modified()
+            return
+        raise
+    with r:
+        if delta:
+            yield from delta.read_snapshot(r)
+        else:
+            yield from iter_resources(r)
+
+
+CHUNK_SIZE = 64 * 1024
+_WS = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class _JSONStream:
+    """Text buffer over a binary file that only keeps the unparsed tail."""
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = self.fp.read(self.chunk_size)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} at offset {self.pos}, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self):
+        while True:
+            self.peek()
             try:
-                from datetime import timedelta
-                t = datetime.fromisoformat(fech_actual.replace("Z", "+00:00"))
-                predicted_arrival = (t + timedelta(seconds=int(tiempo1))).isoformat()
-            except Exception:
-                pass
-        try:
-            conn.execute("""
-                INSERT OR IGNORE INTO estimaciones
-                (collected_at, parada_id, linea, fech_actual, tiempo1, tiempo2,
-                 distancia1, distancia2, destino1, destino2, predicted_arrival)
-                VALUES (?,?,?,?,?,?,?,?,?,?,?)
-            """, (
-                collected_at,
-                item.get("ayto:paradaId"),
-                item.get("ayto:etiqLinea"),
-                fech_actual,
-                tiempo1,
-                item.get("ayto:tiempo2"),
-                item.get("ayto:distancia1"),
-                item.get("ayto:distancia2"),
-                item.get("ayto:destino1"),
-                item.get("ayto:destino2"),
-                predicted_arrival
-            ))
-            inserted += conn.execute("SELECT changes()").fetchone()[0]
-        except Exception as e:
-            print(f"  estimaciones insert error: {e}")
-    conn.commit()
-    print(f"[{collected_at}] estimaciones: {inserted} new rows from {len(rows)} fetched")
-
-def collect_posiciones(conn):
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self.fill()
+                continue
+            # A number cut off at the buffer edge still decodes; make sure
+            # the value was really complete
+            if end == len(self.buf) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_resources(fp, chunk_size=CHUNK_SIZE):
+    """
+    Yield the items of the top-level "resources" array of the JSON document
+    in binary file `fp`, one at a time.
+
+    Only the current item and one read chunk are held in memory, so peak
+    usage does not depend on the number of rows requested. Other top-level
+    keys are decoded and discarded.
+    """
+    stream = _JSONStream(fp, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "resources":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.peek() == "]":
+                        stream.pos += 1
+                        break
+                    stream.expect(",")
+        else:
+            stream.value()
+        if stream.peek() == "}":
+            return
+        stream.expect(",")
+
+BATCH_SIZE = 1000
+
+ESTIMACIONES_SQL = """
+    INSERT OR IGNORE INTO estimaciones
+    (collected_at, parada_id, linea, fech_actual, tiempo1, tiempo2,
+     distancia1, distancia2, destino1, destino2, predicted_arrival)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+POSICIONES_SQL = """
+    INSERT OR IGNORE INTO posiciones
+    (collected_at, instante, vehiculo, linea, lat, lon, velocidad, estado)
+    VALUES (?,?,?,?,?,?,?,?)
+"""
+
+
+class _HashingReader:
+    """Binary file wrapper that hashes everything read through it."""
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.hash = hashlib.sha1()
+
+    def read(self, size=-1):
+        chunk = self.fp.read(size)
+        self.hash.update(chunk)
+        return chunk
+
+
+class DeltaFilter:
+    """
+    Remembers the previous snapshot of a dataset so unchanged data is
+    dropped before it reaches SQLite.
+
+    Three levels, cheapest first: HTTP validators (ETag/Last-Modified) turn
+    an unchanged snapshot into a 304, or into an empty pull if the server
+    ignores conditional requests; a content hash, computed while the body
+    streams, counts re-served identical payloads; and the UNIQUE keys of
+    the previous snapshot drop the rows it served again, which INSERT OR
+    IGNORE would discard anyway. Only exact repeats are dropped: a row
+    older than others of its vehicle or stop may still be new, and is left
+    to the UNIQUE constraint. Keys with a NULL part never match, as in
+    SQLite.
+
+    Everything learnt from a pull is staged: `filter` records the keys it
+    saw and `read_snapshot` the validators and digest. The caller passes
+    `take_pending()` to `commit` once the rows are stored; if the insert
+    fails the staged state is never committed, so the rows are retried.
+    """
+
+    def __init__(self, key_idx):
+        self.key_idx = key_idx
+        self.seen = set()  # keys of the last committed snapshot
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
+        self._pending = set()
+        self._snapshot = None
+        self.counters = dict.fromkeys(
+            ("pulls", "not_modified", "unchanged", "rows_seen", "rows_skipped"), 0
+        )
+
+    def request_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def not_modified(self):
+        self.counters["pulls"] += 1
+        self.counters["not_modified"] += 1
+
+    def read_snapshot(self, response):
+        """
+        Yield the resources of a 200 response, or nothing if its validators
+        match the snapshot already stored.
+
+        The body is hashed as it streams through `iter_resources`, so memory
+        stays flat; the digest is only known at the end, so an identical
+        payload is still parsed, and its rows are left to `filter`. The
+        validators and digest are staged once the stream is complete.
+        """
+        self.counters["pulls"] += 1
+        self._snapshot = None
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if (etag or last_modified) and (etag, last_modified) == (self.etag, self.last_modified):
+            self.counters["unchanged"] += 1
+            return
+        reader = _HashingReader(response)
+        yield from iter_resources(reader)
+        digest = reader.hash.hexdigest()
+        if digest == self.content_hash:
+            self.counters["unchanged"] += 1
+        self._snapshot = (etag, last_modified, digest)
+
+    def filter(self, rows):
+        """Yield only rows whose UNIQUE key the previous snapshot did not serve."""
+        seen = self.seen
+        pending = self._pending = set()
+        key_idx = self.key_idx
+        for row in rows:
+            self.counters["rows_seen"] += 1
+            key = tuple(row[i] for i in key_idx)
+            if None not in key:
+                pending.add(key)
+                if key in seen:
+                    self.counters["rows_skipped"] += 1
+                    continue
+            yield row
+
+    def take_pending(self):
+        pending = (self._pending, self._snapshot)
+        self._pending, self._snapshot = set(), None
+        return pending
+
+    def commit(self, pending):
+        keys, snapshot = pending
+        # Only a snapshot read to the end replaces the keys; a 304 or a
+        # validator match reads no rows and keeps the previous ones. Keys
+        # the API no longer serves are forgotten, so memory stays at one
+        # snapshot
+        if snapshot is not None:
+            self.seen = keys
+            self.etag, self.last_modified, self.content_hash = snapshot
+
+    def summary(self):
+        c = self.counters
+        return (f"{c['rows_skipped']}/{c['rows_seen']} rows skipped, "
+                f"{c['not_modified']} not modified and {c['unchanged']} unchanged "
+                f"of {c['pulls']} pulls")
+
+
+def estimaciones_delta():
+    # (parada_id, linea, fech_actual), the table's UNIQUE key
+    return DeltaFilter(key_idx=(1, 2, 3))
+
+def posiciones_delta():
+    # (vehiculo, instante), the table's UNIQUE key
+    return DeltaFilter(key_idx=(2, 1))
+
+
+def _predicted_arrival(fech_actual, tiempo1):
+    """fechActual + tiempo1 seconds, or None if either is missing or malformed."""
+    if not fech_actual or tiempo1 is None:
+        return None
+    try:
+        t = datetime.fromisoformat(fech_actual.replace("Z", "+00:00"))
+        return (t + timedelta(seconds=int(tiempo1))).isoformat()
+    except (ValueError, TypeError):
+        return None
+
+def normalise_estimaciones(items, collected_at):
+    """API resources → parameter tuples matching ESTIMACIONES_SQL (lazily)."""
+    return (
+        (
+            collected_at,
+            item.get("ayto:paradaId"),
+            item.get("ayto:etiqLinea"),
+            item.get("ayto:fechActual"),
+            item.get("ayto:tiempo1"),
+            item.get("ayto:tiempo2"),
+            item.get("ayto:distancia1"),
+            item.get("ayto:distancia2"),
+            item.get("ayto:destino1"),
+            item.get("ayto:destino2"),
+            _predicted_arrival(item.get("ayto:fechActual"), item.get("ayto:tiempo1")),
+        )
+        for item in items
+    )
+
+def normalise_posiciones(items, collected_at):
+    """API resources → parameter tuples matching POSICIONES_SQL (lazily)."""
+    return (
+        (
+            collected_at,
+            item.get("ayto:instante"),
+            item.get("ayto:vehiculo"),
+            item.get("ayto:linea"),
+            item.get("wgs84_pos:lat"),
+            item.get("wgs84_pos:long"),
+            item.get("ayto:velocidad"),
+            item.get("ayto:estado"),
+        )
+        for item in items
+    )
+
+def insert_batches(conn, sql, rows, batch_size=BATCH_SIZE, dataset=None):
+    """
+    Insert `rows` with one executemany per batch, all in a single transaction.
+    With `dataset`, its `ingest_meta` row count is updated in that same
+    transaction.
+
+    `rows` may be any iterable, including a generator fed from the network;
+    only one batch is materialised at a time.
+
+    Returns a list of per-batch stats dicts (rows, inserted, duplicates);
+    inserted counts come from `total_changes` deltas, so there is no extra
+    round trip per row.
+    """
+    stats = []
+    rows = iter(rows)
+    with conn:
+        while batch := list(itertools.islice(rows, batch_size)):
+            before = conn.total_changes
+            conn.executemany(sql, batch)
+            inserted = conn.total_changes - before
+            stats.append({
+                "rows": len(batch),
+                "inserted": inserted,
+                "duplicates": len(batch) - inserted,
+            })
+        if dataset:
+            count_inserted(conn, dataset, sum(s["inserted"] for s in stats))
+    return stats
+
+def _report(dataset, collected_at, stats, elapsed, conn=None):
+    fetched = sum(s["rows"] for s in stats)
+    inserted = sum(s["inserted"] for s in stats)
+    if conn is not None:
+        record_ingest(conn, dataset, inserted, elapsed, collected_at)
+    print(f"[{collected_at}] {dataset}: {inserted} new rows from {fetched} fetched "
+          f"({fetched - inserted} duplicates, {len(stats)} batches, {elapsed * 1000:.0f} ms)")
+
+def collect_estimaciones(conn, delta=None):
+    collected_at = datetime.now(timezone.utc).isoformat()
+    t0 = time.perf_counter()
+    rows = normalise_estimaciones(fetch_resources("control_flotas_estimaciones", delta=delta), collected_at)
+    if delta:
+        rows = delta.filter(rows)
+    stats = insert_batches(conn, ESTIMACIONES_SQL, rows, dataset="estimaciones")
+    _report("estimaciones", collected_at, stats, time.perf_counter() - t0, conn)
+    if delta:
+        delta.commit(delta.take_pending())
+        print(f"  estimaciones delta: {delta.summary()}")
+    return stats
+
+def collect_posiciones(conn, delta=None):
     collected_at = datetime.now(timezone.utc).isoformat()
-    rows = fetch_json("control_flotas_posiciones")
-    inserted = 0
-    for item in rows:
-        try:
-            conn.execute("""
-                INSERT OR IGNORE INTO posiciones
-                (collected_at, instante, vehiculo, linea, lat, lon, velocidad, estado)
-                VALUES (?,?,?,?,?,?,?,?)
-            """, (
-                collected_at,
-                item.get("ayto:instante"),
-                item.get("ayto:vehiculo"),
-                item.get("ayto:linea"),
-                item.get("wgs84_pos:lat"),
-                item.get("wgs84_pos:long"),
-                item.get("ayto:velocidad"),
-                item.get("ayto:estado"),
-            ))
-            inserted += conn.execute("SELECT changes()").fetchone()[0]
-        except Exception as e:
-            print(f"  posiciones insert error: {e}")
-    conn.commit()
-    print(f"[{collected_at}] posiciones: {inserted} new rows from {len(rows)} fetched")
+    t0 = time.perf_counter()
+    rows = normalise_posiciones(fetch_resources("control_flotas_posiciones", delta=delta), collected_at)
+    if delta:
+        rows = delta.filter(rows)
+    stats = insert_batches(conn, POSICIONES_SQL, rows, dataset="posiciones")
+    _report("posiciones", collected_at, stats, time.perf_counter() - t0, conn)
+    if delta:
+        delta.commit(delta.take_pending())
+        print(f"  posiciones delta: {delta.summary()}")
+    return stats
 
 if __name__ == "__main__":
     import sys
+    mode = sys.argv[1] if len(sys.argv) > 1 else "both"
+    if mode == "daemon":
+        from pulsetransit.daemon import run_daemon
+        run_daemon()
+        sys.exit(0)
     conn = get_connection()
     init_db(conn)
-    mode = sys.argv[1] if len(sys.argv) > 1 else "both"
     if mode in ("estimaciones", "both"):
         collect_estimaciones(conn)
     if mode in ("posiciones", "both"):
@@ -0,0 +1,217 @@
+# src/pulsetransit/daemon.py
+"""
+Long-running collector.
+
+Each dataset gets its own fetch thread on its own interval (the same
+cadence as the Cloudflare worker: estimaciones every 2 min, posiciones
+hourly), reusing one keep-alive HTTP connection. Rows are parsed off the
+socket and handed over in batches to a queue drained by a single writer
+thread that owns the SQLite connection, so a slow API response never
+holds up inserts and only one thread writes. The queue is bounded: if
+the writer falls behind, fetchers wait for it, and if it dies the daemon
+stops.
+
+    python src/pulsetransit/collector.py daemon
+"""
+import http.client
+import itertools
+import queue
+import signal
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from pulsetransit import collector
+from pulsetransit.collector import (
+    BATCH_SIZE,
+    ESTIMACIONES_INTERVAL_S,
+    ESTIMACIONES_SQL,
+    POSICIONES_INTERVAL_S,
+    POSICIONES_SQL,
+    _report,
+    dataset_path,
+    estimaciones_delta,
+    insert_batches,
+    iter_resources,
+    normalise_estimaciones,
+    normalise_posiciones,
+    posiciones_delta,
+)
+from pulsetransit.db import get_connection, init_db
+
+# Batches of BATCH_SIZE rows waiting for the writer
+WRITE_QUEUE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class Dataset:
+    name: str
+    api_name: str
+    interval: float  # seconds between fetches
+    normalise: object
+    sql: str
+    delta: object  # factory for the dataset's DeltaFilter
+
+
+DATASETS = (
+    Dataset("estimaciones", "control_flotas_estimaciones", ESTIMACIONES_INTERVAL_S,
+            normalise_estimaciones, ESTIMACIONES_SQL, estimaciones_delta),
+    Dataset("posiciones", "control_flotas_posiciones", POSICIONES_INTERVAL_S,
+            normalise_posiciones, POSICIONES_SQL, posiciones_delta),
+)
+
+
+class KeepAliveClient:
+    """One persistent HTTP connection to the API, reopened after any error."""
+
+    def __init__(self, host=None, timeout=30):
+        # Looked up per client, so a changed collector.API_HOST applies
+        self.host = host or collector.API_HOST
+        self.timeout = timeout
+        self._conn = None
+
+    def _get(self, path, headers):
+        for attempt in (1, 2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, timeout=self.timeout)
+            try:
+                self._conn.request("GET", path, headers=headers)
+                return self._conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                self.close()
+                # The server may have dropped an idle connection; retry once
+                # on a fresh one before giving up
+                if attempt == 2:
+                    raise
+
+    def iter_resources(self, dataset, delta, rows=5000):
+        """
+        Stream the dataset's resources (see `collector.iter_resources`),
+        conditionally on `delta`'s validators.
+        """
+        r = self._get(dataset_path(dataset, rows), delta.request_headers())
+        try:
+            if r.status == 304:
+                delta.not_modified()
+            elif r.status != 200:
+                raise http.client.HTTPException(f"{dataset}: HTTP {r.status}")
+            else:
+                yield from delta.read_snapshot(r)
+            r.read()  # drain the rest so the connection can be reused
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _put(writes, item, stop):
+    """Queue `item` for the writer, giving up if the daemon is stopping."""
+    while not stop.is_set():
+        try:
+            writes.put(item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _fetch_loop(dataset, writes, stop):
+    client = KeepAliveClient()
+    delta = dataset.delta()
+    next_run = time.monotonic()
+    while not stop.is_set():
+        collected_at = datetime.now(timezone.utc).isoformat()
+        items = client.iter_resources(dataset.api_name, delta)
+        rows = delta.filter(dataset.normalise(items, collected_at))
+        ok = True
+        try:
+            while batch := list(itertools.islice(rows, BATCH_SIZE)):
+                if not _put(writes, (dataset, collected_at, batch), stop):
+                    break
+        except Exception as e:
+            ok = False
+            print(f"[{collected_at}] {dataset.name}: fetch failed: {e}")
+        # End of this pull: the writer commits the delta's staged versions
+        # once it has stored every batch
+        _put(writes, (dataset, collected_at, (delta, delta.take_pending(), ok)), stop)
+        next_run += dataset.interval
+        # Skip missed slots instead of firing a burst after a long stall
+        while next_run <= time.monotonic():
+            next_run += dataset.interval
+        stop.wait(next_run - time.monotonic())
+    client.close()
+
+
+def _write_loop(writes, stop):
+    conn = get_connection()
+    init_db(conn)
+    pulls = {}  # (dataset name, collected_at) → [start time, batch stats, ok]
+    try:
+        while not (stop.is_set() and writes.empty()):
+            try:
+                dataset, collected_at, rows = writes.get(timeout=1)
+            except queue.Empty:
+                continue
+            key = (dataset.name, collected_at)
+            pull = pulls.setdefault(key, [time.perf_counter(), [], True])
+            if isinstance(rows, tuple):
+                del pulls[key]
+                delta, pending, fetched_ok = rows
+                if fetched_ok and pull[2]:
+                    delta.commit(pending)
+                _report(dataset.name, collected_at, pull[1], time.perf_counter() - pull[0], conn)
+                print(f"  {dataset.name} delta: {delta.summary()}")
+                continue
+            try:
+                pull[1] += insert_batches(conn, dataset.sql, rows, dataset=dataset.name)
+            except Exception as e:
+                pull[2] = False
+                print(f"[{collected_at}] {dataset.name}: insert failed: {e}")
+    except BaseException:
+        # Nothing else drains the queue, so take the whole daemon down
+        print("Writer thread crashed; stopping the collector daemon")
+        traceback.print_exc()
+        stop.set()
+        raise
+    finally:
+        conn.close()
+
+
+def run_daemon(datasets=DATASETS, stop=None):
+    """
+    Run the collector until SIGINT/SIGTERM (or until `stop` is set).
+
+    Pending writes are flushed before returning.
+    """
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+    writes = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer = threading.Thread(target=_write_loop, args=(writes, stop), name="writer")
+    fetchers = [
+        threading.Thread(target=_fetch_loop, args=(d, writes, stop), name=f"fetch-{d.name}", daemon=True)
+        for d in datasets
+    ]
+    writer.start()
+    for t in fetchers:
+        t.start()
+    print(f"Collector daemon running: "
+          + ", ".join(f"{d.name} every {d.interval:g}s" for d in datasets))
+
+    while not stop.is_set():
+        stop.wait(1)
+        if not writer.is_alive():
+            print("Writer thread exited; stopping the collector daemon")
+            stop.set()
+    for t in fetchers:
+        t.join(timeout=35)
+    writer.join()
+    print("Collector daemon stopped")
@@ -7,26 +7,31 @@ from zoneinfo import ZoneInfo
 TZ = ZoneInfo("Europe/Madrid")
 from pathlib import Path
 
-from pulsetransit.dashboard.map import (
-    build_map,
-    load_stops,
-    load_shapes,
-    load_trips,
-    load_routes,
-)
-from pulsetransit.dashboard.schedules import get_next_departures
+from pulsetransit.dashboard.map import add_vehicle_layer, build_cached_map
+from pulsetransit.dashboard.gtfs_state import get_gtfs_data
+from pulsetransit.spatial import get_stop_index
+from pulsetransit.search import get_stop_search_index
+from pulsetransit.live import REFRESH_S, get_live_positions
+from pulsetransit.realtime import get_realtime_arrivals
+from pulsetransit.planner import format_seconds, get_timetable
 from pulsetransit.cfg.config import LANG
 
-def render_interactive_map(stops, shapes, trips, routes, highlight_stop_id=None, lang_code='es'):
+# The GTFS views shared across sessions are shallow copies; pandas 3
+# always copies on write, on 2.x it has to be switched on for this process
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+def render_interactive_map(stops, highlight_stop_id=None, lang_code='es', vehicles=None):
     """Render map and handle click interactions"""
-    fig = build_map(
-        stops=stops, 
-        shapes=shapes, 
-        trips=trips, 
-        routes=routes,
+    # Routes and stops come prebuilt from the per-feed, per-language cache;
+    # only the highlight and viewport change per interaction
+    fig = build_cached_map(
+        stops=stops,
         highlight_stop_id=highlight_stop_id,
         lang_code=lang_code
     )
+    if vehicles is not None:
+        fig = add_vehicle_layer(fig, vehicles, lang_code)
 
     selected_point = st.plotly_chart(
         fig,
@@ -43,17 +48,72 @@ def render_interactive_map(stops, shapes, trips, routes, highlight_stop_id=None,
             clicked_lat = point["lat"]
             clicked_lon = point["lon"]
 
-            stops["dist"] = (
-                (stops["stop_lat"] - clicked_lat) ** 2 +
-                (stops["stop_lon"] - clicked_lon) ** 2
-            )
-            nearest_stop = stops.loc[stops["dist"].idxmin()]
-            new_stop_id = int(nearest_stop["stop_id"])
+            nearest_ids, _ = get_stop_index().nearest(clicked_lat, clicked_lon, k=1)
+            new_stop_id = int(nearest_ids[0])
 
             if new_stop_id != st.session_state.clicked_stop_id:
                 st.session_state.clicked_stop_id = new_stop_id
                 st.rerun()
 
+@st.fragment(run_every=REFRESH_S)
+def render_live_map(stops, highlight_stop_id=None, lang_code='es'):
+    """Map with live buses; each tick reruns only this fragment"""
+    # Shared across sessions; reads only the fixes stored since the last tick
+    vehicles = get_live_positions().snapshot()
+    if vehicles.empty:
+        st.caption(LANG[lang_code]["no_live_buses"])
+    render_interactive_map(stops, highlight_stop_id, lang_code, vehicles)
+
+def render_map(stops, highlight_stop_id=None, lang_code='es', live=False):
+    if live:
+        render_live_map(stops, highlight_stop_id=highlight_stop_id, lang_code=lang_code)
+    else:
+        render_interactive_map(stops, highlight_stop_id=highlight_stop_id, lang_code=lang_code)
+
+def stop_picker(label, t, key, collapsed=True):
+    """Search box plus a list of the best matches; returns the chosen stop_id or None"""
+    query = st.text_input(
+        label,
+        placeholder=t["search_placeholder"],
+        label_visibility='collapsed' if collapsed else 'visible',
+        key=f"{key}_query"
+    )
+
+    # Best match is selected straight away; the rest stay one click away
+    if not query:
+        return None
+    matches = get_stop_search_index().search(query, limit=8)
+    if not matches:
+        st.caption(t["no_matches"])
+        return None
+    labels = {m.stop_id: m.label for m in matches}
+    return st.selectbox(
+        label,
+        options=list(labels),
+        format_func=labels.get,
+        label_visibility='collapsed',
+        key=f"{key}_match"
+    )
+
+def display_journey(journey, stops, t):
+    """Journey summary and one row per leg"""
+    minutes = (journey.arrive - journey.depart) // 60
+    st.markdown(
+        f"**{t['arrive_at']} {format_seconds(journey.arrive)}** · {minutes} {t['min']} · "
+        f"{journey.transfers} {t['transfers']}"
+    )
+    names = stops.set_index("stop_id")["stop_name"]
+    legs = journey.to_frame()
+    legs["mode"] = [
+        f"🚌 {route}" if mode == "bus" else f"🚶 {t['walk']}"
+        for mode, route in zip(legs["mode"], legs["route_short_name"])
+    ]
+    legs["from_stop"] = legs["from_stop"].map(names)
+    legs["to_stop"] = legs["to_stop"].map(names)
+    display = legs[["mode", "trip_headsign", "from_stop", "depart", "to_stop", "arrive"]]
+    display.columns = [t["line"], t["destination"], t["from"], t["depart"], t["to"], t["arrive"]]
+    st.dataframe(display, width='stretch', hide_index=True)
+
 def display_stop_schedule(active_stop_id, stops, t):
     """Display schedule for a given stop"""
     st.subheader(t["scheduled_departures"])
@@ -63,12 +123,15 @@ def display_stop_schedule(active_stop_id, stops, t):
     st.markdown(f"**{active_stop_id} - {stop_name}**")
 
     reference_dt = datetime.now(tz=TZ)
-    departures = get_next_departures(active_stop_id, reference_dt, limit=10)
+    # Live predictions come from memory (refreshed in the background) and
+    # replace the matching scheduled departures
+    departures = get_realtime_arrivals().stop_arrivals(active_stop_id, reference_dt, limit=10)
 
     if not departures.empty:
-        departures["In"] = departures["minutes_until"].apply(
-            lambda m: f"{m} min" if m > 0 else "Now"
-        )
+        departures["In"] = [
+            ("📡 " if live else "") + (f"{m} min" if m > 0 else "Now")
+            for m, live in zip(departures["minutes_until"], departures["realtime"])
+        ]
         display = departures[[
             "route_short_name",
             "trip_headsign",
@@ -78,6 +141,8 @@ def display_stop_schedule(active_stop_id, stops, t):
         display.columns = [t["line"], t["destination"], t["time"], t["in"]]
 
         st.dataframe(display, width='stretch', hide_index=True)
+        if departures["realtime"].any():
+            st.caption(t["realtime_legend"])
     else:
         st.info("No upcoming departures found for this stop.")
 
@@ -120,11 +185,10 @@ with col1:
     st.markdown(f"**{t['subtitle']}** · Santander, España", unsafe_allow_html=True)
 
 
-# Load GTFS data
-stops = load_stops()
-shapes = load_shapes()
-trips = load_trips()
-routes = load_routes()
+# GTFS data is loaded once per process and shared by all sessions; `stops`
+# is this session's view of it
+gtfs = get_gtfs_data()
+stops = gtfs.stops
 
 # Initialize session state
 if "clicked_stop_id" not in st.session_state:
@@ -145,22 +209,11 @@ tab_browse, tab_plan = st.tabs([f"📅 {t['browse_tab']}", f"🚏 {t['plan_tab']
 
 with tab_browse:
     # SEARCH ABOVE MAP
-    stops["search_label"] = stops["stop_id"].astype(str) + " - " + stops["stop_name"]
-    stop_options = [""] + stops["search_label"].tolist()
     st.info(f"👆 {t['click_info']}")
 
-    selected_stop_label = st.selectbox(
-        t["search_stop"],
-        options=stop_options,
-        index=None,
-        placeholder=t["search_placeholder"],
-        label_visibility='collapsed'
-    )
+    show_live = st.toggle(f"📍 {t['live_buses']}", key="show_live")
 
-    # Parse selected stop
-    selected_stop_id = None
-    if selected_stop_label:
-        selected_stop_id = int(selected_stop_label.split(" - ")[0])
+    selected_stop_id = stop_picker(t["search_stop"], t, key="browse")
 
     # Determine active stop: search bar > map click
     if selected_stop_id:
@@ -175,7 +228,7 @@ with tab_browse:
         if active_stop_id: display_stop_schedule(active_stop_id, stops, t)
 
         # Map schedules on mobile
-        render_interactive_map(stops, shapes, trips, routes, highlight_stop_id=active_stop_id, lang_code=lang_code)
+        render_map(stops, highlight_stop_id=active_stop_id, lang_code=lang_code, live=show_live)
 
     else:
         # Desktop: Full-width map until stop is selected
@@ -184,21 +237,41 @@ with tab_browse:
             col1, col2 = st.columns([2, 1])
 
             with col1:
-                render_interactive_map(stops, shapes, trips, routes, highlight_stop_id=active_stop_id, lang_code=lang_code)
+                render_map(stops, highlight_stop_id=active_stop_id, lang_code=lang_code, live=show_live)
 
             with col2:
                 display_stop_schedule(active_stop_id, stops, t)
 
         else:
-            render_interactive_map(stops, shapes, trips, routes, highlight_stop_id=None , lang_code=lang_code)
+            render_map(stops, highlight_stop_id=None, lang_code=lang_code, live=show_live)
+
+if query_params.get("debug"):
+    st.caption(
+        f"GTFS memory: {gtfs.shared_bytes() / 2**20:.1f} MiB shared by all sessions, "
+        f"{gtfs.session_bytes(stops, 'stops') / 2**10:.1f} KiB in this session"
+    )
 
 with tab_plan:
     st.subheader(t["plan_trip"])
 
+    col_from, col_to = st.columns(2)
+    with col_from:
+        origin_id = stop_picker(t["from"], t, key="origin", collapsed=False)
+    with col_to:
+        destination_id = stop_picker(t["to"], t, key="destination", collapsed=False)
+
     # Query time
     query_time = st.time_input(
         t["query_time"],
         value=datetime.now(tz=TZ).time(),
-        help="Show schedules for this time of day"
+        help=t["query_time_help"]
     )
-    st.info(t["coming_soon"])
+
+    if origin_id and destination_id:
+        # Connection scan over the shared, preloaded timetable
+        departure = datetime.combine(datetime.now(tz=TZ).date(), query_time)
+        journey = get_timetable().plan(origin_id, destination_id, departure)
+        if journey is None:
+            st.info(t["no_journey"])
+        else:
+            display_journey(journey, stops, t)
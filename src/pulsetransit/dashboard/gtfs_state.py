@@ -0,0 +1,66 @@
+"""
+Process-wide, read-only GTFS tables for the dashboard.
+
+Every Streamlit session used to load its own copies of stops, shapes,
+trips and routes on each rerun. `get_gtfs_data()` loads them once per
+feed and hands out shallow views: a session can add or replace columns
+on its view without touching the shared frames, and without copying the
+columns it leaves alone. Editing values of a shared column in place is
+only isolated under copy-on-write, which pandas 3 always uses and the
+dashboard entry point (app.py) switches on for pandas 2; this module
+leaves the process-wide pandas options alone.
+"""
+import pandas as pd
+from dataclasses import dataclass
+from functools import lru_cache
+
+from pulsetransit.gtfs_cache import feed_hash, load_table
+
+TABLES = ("stops", "shapes", "trips", "routes")
+
+
+@dataclass(frozen=True)
+class GTFSData:
+    _frames: dict[str, pd.DataFrame]
+
+    def view(self, name: str) -> pd.DataFrame:
+        """Shallow view of a shared table (see the module docstring)."""
+        return self._frames[name].copy(deep=False)
+
+    @property
+    def stops(self) -> pd.DataFrame:
+        return self.view("stops")
+
+    @property
+    def shapes(self) -> pd.DataFrame:
+        return self.view("shapes")
+
+    @property
+    def trips(self) -> pd.DataFrame:
+        return self.view("trips")
+
+    @property
+    def routes(self) -> pd.DataFrame:
+        return self.view("routes")
+
+    def shared_bytes(self) -> int:
+        """Memory held once per process by the shared tables."""
+        return sum(int(df.memory_usage(deep=True).sum()) for df in self._frames.values())
+
+    def session_bytes(self, view: pd.DataFrame, name: str) -> int:
+        """
+        Memory of the columns a session added to its view of `name`. Columns
+        it overwrote in place are copied too, but are not counted.
+        """
+        own = view.columns.difference(self._frames[name].columns)
+        return int(view[own].memory_usage(deep=True, index=False).sum())
+
+
+@lru_cache(maxsize=1)
+def _cached_gtfs_data(feed: str) -> GTFSData:
+    return GTFSData({name: load_table(name) for name in TABLES})
+
+
+def get_gtfs_data() -> GTFSData:
+    """Shared GTFS tables for the current feed, loaded on first use."""
+    return _cached_gtfs_data(feed_hash())
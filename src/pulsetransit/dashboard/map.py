@@ -1,21 +1,24 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from functools import lru_cache
 from pathlib import Path
 from pulsetransit.cfg.config import LANG
+from pulsetransit.dashboard.gtfs_state import get_gtfs_data
+from pulsetransit.gtfs_cache import GTFS_DIR, feed_hash, load_table
 SANTANDER = dict(lat=43.4623, lon=-3.8099)
-GTFS_DIR = Path("data/gtfs-static")
 
 def load_stops() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "stops.txt")
+    return load_table("stops")
 
 def load_shapes() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "shapes.txt")
+    return load_table("shapes")
 
 def load_routes() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "routes.txt")
+    return load_table("routes")
 
 def load_trips() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "trips.txt")
+    return load_table("trips")
 
 def _build_shape_colors(trips: pd.DataFrame, routes: pd.DataFrame) -> dict:
     """Map shape_id → (route_short_name, #rrggbb color)."""
@@ -29,116 +32,202 @@ def _build_shape_colors(trips: pd.DataFrame, routes: pd.DataFrame) -> dict:
     )
     return merged.set_index("shape_id")[["route_short_name", "color"]].to_dict("index")
 
+def _route_sort_key(name_key: str) -> tuple:
+    """Sort: LC first, then by route number and suffix, then the rest."""
+    if name_key == "LC":
+        return (0, 0, "")
+
+    if name_key[0].isdigit():
+        num_part = ""
+        for char in name_key:
+            if char.isdigit():
+                num_part += char
+            else:
+                break
+
+        if num_part == name_key:
+            return (1, int(num_part), "")
+        else:
+            suffix = name_key[len(num_part):]
+            return (1, int(num_part), suffix)
+
+    return (2, 0, name_key)
+
+def _sorted_shapes(shapes: pd.DataFrame):
+    """
+    Shape points sorted by (shape, sequence) in one lexsort.
+
+    Returns (codes, shape_ids, lats, lons, starts, ends): `codes[i]` indexes
+    `shape_ids` (in first-appearance order) and shape k spans
+    [starts[k], ends[k]) of the sorted arrays.
+    """
+    codes, shape_ids = pd.factorize(shapes["shape_id"])
+    order = np.lexsort((shapes["shape_pt_sequence"].to_numpy(), codes))
+    codes = codes[order]
+    lats = shapes["shape_pt_lat"].to_numpy(dtype=float)[order]
+    lons = shapes["shape_pt_lon"].to_numpy(dtype=float)[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], int)
+    ends = np.r_[starts[1:], len(codes)].astype(int)
+    return codes, shape_ids, lats, lons, starts, ends
+
+def _nan_separated(lats, lons, starts, ends, group_of_shape):
+    """
+    Concatenate shapes into one NaN-separated polyline per group.
+
+    `group_of_shape[k]` is the group of shape k, or -1 to drop it. Returns
+    {group: (lats, lons)}, keeping shape order within each group.
+    """
+    lengths = ends - starts
+    point_group = np.repeat(group_of_shape, lengths)
+    # A NaN after each shape, tagged with that shape's group
+    lats = np.insert(lats, ends, np.nan)
+    lons = np.insert(lons, ends, np.nan)
+    point_group = np.insert(point_group, ends, group_of_shape)
+
+    keep = point_group >= 0
+    lats, lons, point_group = lats[keep], lons[keep], point_group[keep]
+    order = np.argsort(point_group, kind="stable")
+    groups, first = np.unique(point_group[order], return_index=True)
+    bounds = np.r_[first, len(order)]
+    return {
+        int(g): (lats[order[bounds[i]:bounds[i + 1]]], lons[order[bounds[i]:bounds[i + 1]]])
+        for i, g in enumerate(groups)
+    }
+
 def _shapes_to_lines_colored(
     shapes: pd.DataFrame,
     shape_colors: dict,
     lang_code: str,
 ) -> list[dict]:
-    """One trace per route, with None separators within each."""
-    route_groups: dict[str, dict] = {}
+    """One trace per route, with NaN separators between its shapes."""
     t = LANG[lang_code]
-    
-    for shape_id, group in shapes.groupby("shape_id", sort=False):
+    _, shape_ids, lats, lons, starts, ends = _sorted_shapes(shapes)
+
+    # Group by route NAME (not color); the first shape seen sets the color
+    names, colors = [], []
+    group_of_shape = np.full(len(shape_ids), -1)
+    for k, shape_id in enumerate(shape_ids):
         info = shape_colors.get(shape_id)
-        if info is None:
+        if info is None or info["route_short_name"] == "99":  # remove 99 lanzadera
             continue
-        
-        color = info["color"]
         name = info["route_short_name"]
-        if name == "99": continue # remove 99 lanzadera from list
-        # Group by route NAME (not color)
-        if name not in route_groups:
-            route_groups[name] = {
-                "name": f"{t['line']} {name}",
-                "color": color,
-                "lats": [],
-                "lons": []
-            }
-        
-        pts = group.sort_values("shape_pt_sequence")
-        route_groups[name]["lats"].extend(pts["shape_pt_lat"].tolist() + [None])
-        route_groups[name]["lons"].extend(pts["shape_pt_lon"].tolist() + [None])
-    
-    # Sort: LC first, then by route number
-    def sort_key(item):
-        name_key, data = item
-        
-        if name_key == "LC":
-            return (0, 0, "")
-        
-        if name_key[0].isdigit():
-            num_part = ""
-            for char in name_key:
-                if char.isdigit():
-                    num_part += char
-                else:
-                    break
-            
-            if num_part == name_key:
-                return (1, int(num_part), "")
-            else:
-                suffix = name_key[len(num_part):]
-                return (1, int(num_part), suffix)
-        
-        return (2, 0, name_key)
-    
-    sorted_groups = sorted(route_groups.items(), key=sort_key)
-    
-    return [{"color": v["color"], "name": v["name"], "lats": v["lats"], "lons": v["lons"]} for k, v in sorted_groups]
+        if name not in names:
+            names.append(name)
+            colors.append(info["color"])
+        group_of_shape[k] = names.index(name)
+
+    lines = _nan_separated(lats, lons, starts, ends, group_of_shape)
+    return [
+        {"color": colors[g], "name": f"{t['line']} {names[g]}", "lats": lines[g][0], "lons": lines[g][1]}
+        for g in sorted(lines, key=lambda g: _route_sort_key(names[g]))
+    ]
 
 def _extract_arrow_points(shapes: pd.DataFrame, shape_colors: dict, interval: int = 15) -> list[dict]:
-    """Extract evenly-spaced arrow markers along each shape."""
+    """
+    Evenly-spaced arrow markers along each shape: every `interval`-th point,
+    pointing at the next sampled point. Bearings for all shapes are computed
+    in one vectorized pass.
+    """
+    codes, shape_ids, lats, lons, starts, ends = _sorted_shapes(shapes)
+    position = np.arange(len(codes)) - np.repeat(starts, ends - starts)
+    sampled = np.flatnonzero(position % interval == 0)
+    cur, nxt = sampled[:-1], sampled[1:]
+    same_shape = codes[cur] == codes[nxt]
+    cur, nxt = cur[same_shape], nxt[same_shape]
+
+    # Simple angle calculation (good enough for small distances)
+    angles = np.degrees(np.arctan2(lons[nxt] - lons[cur], lats[nxt] - lats[cur]))
+
+    arrow_codes = codes[cur]
+    bounds = np.flatnonzero(np.r_[True, arrow_codes[1:] != arrow_codes[:-1], True])
     arrows = []
-    for shape_id, group in shapes.groupby("shape_id", sort=False):
-        info = shape_colors.get(shape_id, {"route_short_name": "?", "color": "#888888"})
-        pts = group.sort_values("shape_pt_sequence")
-        
-        # Sample every Nth point for arrows
-        sampled = pts.iloc[::interval]
-        if len(sampled) < 2:
-            continue
-        
-        # Calculate bearing from current point to next point
-        lats, lons, angles = [], [], []
-        for i in range(len(sampled) - 1):
-            lat1, lon1 = sampled.iloc[i][["shape_pt_lat", "shape_pt_lon"]]
-            lat2, lon2 = sampled.iloc[i+1][["shape_pt_lat", "shape_pt_lon"]]
-            
-            # Simple angle calculation (good enough for small distances)
-            import math
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            angle = math.degrees(math.atan2(dlon, dlat))
-            
-            lats.append(lat1)
-            lons.append(lon1)
-            angles.append(angle)
-        
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        info = shape_colors.get(shape_ids[arrow_codes[a]], {"route_short_name": "?", "color": "#888888"})
         arrows.append({
-            "lats": lats,
-            "lons": lons,
-            "angles": angles,
+            "lats": lats[cur[a:b]],
+            "lons": lons[cur[a:b]],
+            "angles": angles[a:b],
             "color": info["color"],
             "name": info["route_short_name"],
         })
     return arrows
 
-def build_map(
-    stops: pd.DataFrame | None = None,
-    shapes: pd.DataFrame | None = None,
-    trips: pd.DataFrame | None = None,
-    routes: pd.DataFrame | None = None,
-    highlight_stop_id: int | None = None,
-    lang_code: str = 'es',
-) -> go.Figure:
-    fig = go.Figure()
+# Levels of detail: (min zoom, Douglas–Peucker tolerance in metres,
+# arrow interval in original shape points). The overview (zoom 13) uses
+# level 0, the highlighted-stop view (zoom 16) level 2.
+LOD_LEVELS = [
+    (0, 12.0, 45),
+    (14, 5.0, 30),
+    (16, 1.0, 15),
+]
+
+def lod_for_zoom(zoom: float) -> int:
+    """Most detailed level whose min zoom is <= `zoom`."""
+    return max(i for i, (min_zoom, _, _) in enumerate(LOD_LEVELS) if zoom >= min_zoom)
+
+def _douglas_peucker(x: np.ndarray, y: np.ndarray, tolerance: float) -> np.ndarray:
+    """Boolean mask of the points of one polyline kept at `tolerance`."""
+    keep = np.zeros(len(x), dtype=bool)
+    if len(x) == 0:
+        return keep
+    keep[[0, -1]] = True
+    stack = [(0, len(x) - 1)]
+    while stack:
+        s, e = stack.pop()
+        if e - s < 2:
+            continue
+        dx, dy = x[e] - x[s], y[e] - y[s]
+        px, py = x[s + 1:e] - x[s], y[s + 1:e] - y[s]
+        seg = np.hypot(dx, dy)
+        dist = np.abs(dx * py - dy * px) / seg if seg > 0 else np.hypot(px, py)
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            k = s + 1 + i
+            keep[k] = True
+            stack += [(s, k), (k, e)]
+    return keep
+
+def simplify_shapes(shapes: pd.DataFrame, tolerance_m: float) -> pd.DataFrame:
+    """
+    Douglas–Peucker simplification of every shape, with distances in metres
+    on an equirectangular projection (fine at city scale). Returns the kept
+    rows of `shapes`, in (shape, sequence) order.
+    """
+    codes, _, lats, lons, starts, ends = _sorted_shapes(shapes)
+    # Same ordering as _sorted_shapes, to map kept points back to rows
+    order = np.lexsort((shapes["shape_pt_sequence"].to_numpy(), pd.factorize(shapes["shape_id"])[0]))
+    metres_per_deg = 6_371_000 * np.pi / 180
+    y = lats * metres_per_deg
+    x = lons * metres_per_deg * np.cos(np.radians(SANTANDER["lat"]))
+    keep = np.zeros(len(codes), dtype=bool)
+    for s, e in zip(starts, ends):
+        keep[s:e] = _douglas_peucker(x[s:e], y[s:e], tolerance_m)
+    return shapes.iloc[order[keep]].reset_index(drop=True)
 
-    if shapes is not None and trips is not None and routes is not None:
+def _route_traces(
+    shapes: pd.DataFrame,
+    trips: pd.DataFrame | None,
+    routes: pd.DataFrame | None,
+    lang_code: str,
+    lod: int | None = None,
+) -> list[go.Scattermap]:
+    """
+    Route polylines and direction arrows, at full detail or at level `lod`
+    of LOD_LEVELS. Arrows are always placed on the full geometry so their
+    bearings follow the street, just more sparsely at coarse levels.
+    """
+    traces = []
+    arrow_interval = 15
+    line_shapes = shapes
+    if lod is not None:
+        _, tolerance, arrow_interval = LOD_LEVELS[lod]
+        line_shapes = simplify_shapes(shapes, tolerance)
+    if trips is not None and routes is not None:
         shape_colors = _build_shape_colors(trips, routes)
-        
+
         # Route lines
-        for trace in _shapes_to_lines_colored(shapes, shape_colors, lang_code):
-            fig.add_trace(go.Scattermap(
+        for trace in _shapes_to_lines_colored(line_shapes, shape_colors, lang_code):
+            traces.append(go.Scattermap(
                 lat=trace["lats"],
                 lon=trace["lons"],
                 mode="lines",
@@ -147,10 +236,10 @@ def build_map(
                 name=trace["name"],
                 showlegend=True,
             ))
-        
+
         # Direction arrows
-        for arrow in _extract_arrow_points(shapes, shape_colors):
-            fig.add_trace(go.Scattermap(
+        for arrow in _extract_arrow_points(shapes, shape_colors, arrow_interval):
+            traces.append(go.Scattermap(
                 lat=arrow["lats"],
                 lon=arrow["lons"],
                 mode="markers",
@@ -163,99 +252,215 @@ def build_map(
                 hoverinfo="skip",
                 showlegend=False,
             ))
-    
-    elif shapes is not None:
+
+    else:
         # Fallback: no color info
-        lats, lons = [], []
-        for _, group in shapes.groupby("shape_id", sort=False):
-            pts = group.sort_values("shape_pt_sequence")
-            lats.extend(pts["shape_pt_lat"].tolist() + [None])
-            lons.extend(pts["shape_pt_lon"].tolist() + [None])
-        fig.add_trace(go.Scattermap(
+        _, shape_ids, lats, lons, starts, ends = _sorted_shapes(line_shapes)
+        lines = _nan_separated(lats, lons, starts, ends, np.zeros(len(shape_ids), dtype=int))
+        lats, lons = lines.get(0, ([], []))
+        traces.append(go.Scattermap(
             lat=lats, lon=lons, mode="lines",
             line=dict(width=3, color="#888888"),
             hoverinfo="skip", name="Routes",
         ))
-    t= LANG["es"]
-    if stops is not None:
-        # Separate highlighted stop from others
-        if highlight_stop_id is not None:
-            regular_stops = stops[stops["stop_id"] != highlight_stop_id]
-            highlighted = stops[stops["stop_id"] == highlight_stop_id]
-        else:
-            regular_stops = stops
-            highlighted = pd.DataFrame()
-
-        if not regular_stops.empty:
-            # Dark border layer
-            fig.add_trace(go.Scattermap(
-                lat=regular_stops["stop_lat"],
-                lon=regular_stops["stop_lon"],
-                mode="markers",
-                marker=dict(size=10, color="#333333", opacity=0.8),
-                hoverinfo="skip",
-                showlegend=False,
-            ))
-            # Visible inner circle
-            fig.add_trace(go.Scattermap(
-                lat=regular_stops["stop_lat"],
-                lon=regular_stops["stop_lon"],
-                mode="markers",
-                marker=dict(size=7, color="#B8B6B6", opacity=1.0),
-                text=regular_stops["stop_id"].astype(str) + " - " + regular_stops["stop_name"],
-                hovertemplate="<b>%{text}</b><extra></extra>",  # ← simplified
-                name=t["stops"],
-            ))
-# Highlighted stop (larger, bright color)
+    return traces
+
+def _stop_traces(stops: pd.DataFrame, lang_code: str) -> list[go.Scattermap]:
+    """All stops: dark border layer plus visible inner circle."""
+    t = LANG[lang_code]
+    return [
+        go.Scattermap(
+            lat=stops["stop_lat"],
+            lon=stops["stop_lon"],
+            mode="markers",
+            marker=dict(size=10, color="#333333", opacity=0.8),
+            hoverinfo="skip",
+            showlegend=False,
+        ),
+        go.Scattermap(
+            lat=stops["stop_lat"],
+            lon=stops["stop_lon"],
+            mode="markers",
+            marker=dict(size=7, color="#B8B6B6", opacity=1.0),
+            text=stops["stop_id"].astype(str) + " - " + stops["stop_name"],
+            hovertemplate="<b>%{text}</b><extra></extra>",
+            name=t["stops"],
+        ),
+    ]
+
+def _highlight_traces(highlighted: pd.DataFrame, lang_code: str) -> list[go.Scattermap]:
+    """Highlighted stop (larger, bright color), drawn over the stop layer."""
+    t = LANG[lang_code]
+    return [
+        go.Scattermap(
+            lat=highlighted["stop_lat"],
+            lon=highlighted["stop_lon"],
+            mode="markers",
+            marker=dict(size=16, color="#FF4444", opacity=0.9),
+            hoverinfo="skip",
+            showlegend=False,
+        ),
+        go.Scattermap(
+            lat=highlighted["stop_lat"],
+            lon=highlighted["stop_lon"],
+            mode="markers",
+            marker=dict(size=12, color="white", opacity=1.0),
+            text=highlighted["stop_id"].astype(str) + " - " + highlighted["stop_name"],
+            hovertemplate="<b>%{text}</b><extra></extra>",
+            name=t["selected_stop"],
+        ),
+    ]
+
+def _vehicle_traces(
+    vehicles: pd.DataFrame, routes: pd.DataFrame, lang_code: str
+) -> list[go.Scattermap]:
+    """Live buses in their route colour, ringed so they stand out from the stops."""
+    t = LANG[lang_code]
+    info = routes.set_index("route_id")
+    linea = vehicles["linea"]
+    names = linea.map(info["route_short_name"]).fillna(linea.astype(str))
+    colors = linea.map(info["route_color"]).fillna("888888")
+    text = (
+        t["line"] + " " + names.astype(str) + " · " + t["bus"] + " "
+        + vehicles["vehiculo"].astype(str) + " · " + vehicles["instante"].str.slice(11, 19)
+    )
+    return [
+        go.Scattermap(
+            lat=vehicles["lat"],
+            lon=vehicles["lon"],
+            mode="markers",
+            marker=dict(size=14, color="#222222", opacity=0.9),
+            hoverinfo="skip",
+            showlegend=False,
+        ),
+        go.Scattermap(
+            lat=vehicles["lat"],
+            lon=vehicles["lon"],
+            mode="markers",
+            marker=dict(size=10, color="#" + colors.astype(str), opacity=1.0),
+            text=text,
+            hovertemplate="<b>%{text}</b><extra></extra>",
+            name=t["live_buses"],
+        ),
+    ]
+
+def add_vehicle_layer(fig: go.Figure, vehicles: pd.DataFrame, lang_code: str = 'es') -> go.Figure:
+    """
+    Draw live bus positions (as returned by `LivePositions.snapshot`) on
+    top of a map from `build_cached_map`. Only these two traces change
+    between timed refreshes; the base layers still come from the cache.
+    """
+    if not vehicles.empty:
+        fig.add_traces(_vehicle_traces(vehicles, get_gtfs_data().routes, lang_code))
+    return fig
+
+def _apply_overlay(
+    fig: go.Figure,
+    stops: pd.DataFrame | None,
+    highlight_stop_id: int | None,
+    lang_code: str,
+) -> go.Figure:
+    """Add the highlighted stop (if any) and set the viewport."""
+    center, zoom = SANTANDER, 13
+    if stops is not None and highlight_stop_id is not None:
+        highlighted = stops[stops["stop_id"] == highlight_stop_id]
         if not highlighted.empty:
-            fig.add_trace(go.Scattermap(
-                lat=highlighted["stop_lat"],
-                lon=highlighted["stop_lon"],
-                mode="markers",
-                marker=dict(size=16, color="#FF4444", opacity=0.9),
-                hoverinfo="skip",
-                showlegend=False,
-            ))
-            fig.add_trace(go.Scattermap(
-                lat=highlighted["stop_lat"],
-                lon=highlighted["stop_lon"],
-                mode="markers",
-                marker=dict(size=12, color="white", opacity=1.0),
-                text=highlighted["stop_id"].astype(str) + " - " + highlighted["stop_name"],
-                hovertemplate="<b>%{text}</b><extra></extra>",
-                name=t["selected_stop"],
-            ))
-            
+            fig.add_traces(_highlight_traces(highlighted, lang_code))
             # Zoom to highlighted stop
             center = dict(
                 lat=highlighted["stop_lat"].iloc[0],
                 lon=highlighted["stop_lon"].iloc[0]
             )
             zoom = 16  # Closer zoom
-        else:
-            center = SANTANDER
-            zoom = 13
-    else:
-        center = SANTANDER
-        zoom = 13
 
+    # Same stop, same uirevision: a redraw keeps the user's pan and zoom
+    fig.update_layout(map=dict(center=center, zoom=zoom), uirevision=str(highlight_stop_id))
+    return fig
 
-    fig.update_layout(
+def _base_layout() -> dict:
+    return dict(
         map=dict(
             style="open-street-map",
-            center=center,
-            zoom=zoom,
+            center=SANTANDER,
+            zoom=13,
         ),
         legend=dict(bgcolor="rgba(255,255,255,0.8)", borderwidth=1),
         margin=dict(l=0, r=0, t=0, b=0),
         height=600,
     )
-    return fig
+
+def build_map(
+    stops: pd.DataFrame | None = None,
+    shapes: pd.DataFrame | None = None,
+    trips: pd.DataFrame | None = None,
+    routes: pd.DataFrame | None = None,
+    highlight_stop_id: int | None = None,
+    lang_code: str = 'es',
+    lod: int | None = None,
+) -> go.Figure:
+    """Map of the network; `lod` picks a simplified geometry level (None: full)."""
+    fig = go.Figure(layout=_base_layout())
+    if shapes is not None:
+        fig.add_traces(_route_traces(shapes, trips, routes, lang_code, lod))
+    if stops is not None:
+        fig.add_traces(_stop_traces(stops, lang_code))
+    return _apply_overlay(fig, stops, highlight_stop_id, lang_code)
+
+
+@lru_cache(maxsize=2 * len(LOD_LEVELS) * len(LANG))
+def _cached_base_figure(feed: str, lang_code: str, lod: int) -> dict:
+    gtfs = get_gtfs_data()
+    return build_map(
+        stops=gtfs.stops,
+        shapes=gtfs.shapes,
+        trips=gtfs.trips,
+        routes=gtfs.routes,
+        lang_code=lang_code,
+        lod=lod,
+    ).to_dict()
+
+def get_base_figure(lang_code: str = 'es', lod: int = 0) -> dict:
+    """
+    Static layers (routes, arrows, stops) of the current feed as a figure
+    dict, built once per feed, language and level of detail and shared
+    process-wide.
+    """
+    return _cached_base_figure(feed_hash(), lang_code, lod)
+
+def build_cached_map(
+    stops: pd.DataFrame,
+    highlight_stop_id: int | None = None,
+    lang_code: str = 'es',
+) -> go.Figure:
+    """
+    `build_map` for the current feed, reusing the cached base layers so that
+    only the highlight overlay and viewport are computed per call. The base
+    geometry is simplified to match the zoom the overlay will set.
+    """
+    zoom = 16 if highlight_stop_id is not None else 13
+    # The base dict was validated when it was built; plotly copies it, so
+    # the cached version is never mutated
+    fig = go.Figure(get_base_figure(lang_code, lod_for_zoom(zoom)), _validate=False)
+    return _apply_overlay(fig, stops, highlight_stop_id, lang_code)
+
+def lod_report() -> pd.DataFrame:
+    """Shape points and base-figure JSON payload per level of detail."""
+    shapes = load_shapes()
+    rows = [("full", len(shapes), len(build_map(load_stops(), shapes, load_trips(), load_routes()).to_json()))]
+    for lod, (min_zoom, tolerance, _) in enumerate(LOD_LEVELS):
+        points = len(simplify_shapes(shapes, tolerance))
+        payload = len(go.Figure(get_base_figure(lod=lod), _validate=False).to_json())
+        rows.append((f"{lod} (zoom ≥ {min_zoom}, {tolerance:g} m)", points, payload))
+    return pd.DataFrame(rows, columns=["level", "shape_points", "payload_bytes"])
 
 if __name__ == "__main__":
-    build_map(
-        stops=load_stops(),
-        shapes=load_shapes(),
-        trips=load_trips(),
-        routes=load_routes(),
-    ).show()
+    import sys
+    import time
+    if "lod" in sys.argv[1:]:
+        print(lod_report().to_string(index=False))
+        sys.exit(0)
+    for label, highlight in (("cold", None), ("warm", None), ("warm + highlight", 10)):
+        t0 = time.perf_counter()
+        fig = build_cached_map(load_stops(), highlight_stop_id=highlight)
+        print(f"{label:<18} {1000 * (time.perf_counter() - t0):8.1f} ms")
+    fig.show()
@@ -1,26 +1,367 @@
+import threading
+
+import numpy as np
 import pandas as pd
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime, time, timedelta
+from datetime import date, datetime, time, timedelta
 
-GTFS_DIR = Path("data/gtfs-static")
+from pulsetransit.gtfs_cache import GTFS_DIR, feed_hash, load_table
 
-def load_stop_times() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "stop_times.txt")
+def load_stop_times(categorical: bool = False) -> pd.DataFrame:
+    return load_table("stop_times", categorical=categorical)
 
 def load_trips() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "trips.txt")
+    return load_table("trips")
 
 def load_routes() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "routes.txt")
+    return load_table("routes")
 
 def load_calendar_dates() -> pd.DataFrame:
-    return pd.read_csv(GTFS_DIR / "calendar_dates.txt")
+    return load_table("calendar_dates")
+
+
+SECONDS_PER_DAY = 86_400
+_DIGITS = [0, 1, 3, 4, 6, 7]   # positions of H H M M S S in "HH:MM:SS"
+
+
+def parse_gtfs_times(values) -> np.ndarray:
+    """
+    Convert GTFS times ("H:MM:SS" or "HH:MM:SS", hours may run past 23)
+    to int32 seconds since the start of the service day, in one vectorized
+    pass over the raw bytes. Empty or missing times become -1.
+    """
+    strings = pd.Series(values, dtype=object).fillna("")
+    raw = np.asarray(strings.to_numpy(), dtype="S9")
+    if (raw.view(np.uint8) == ord(" ")).any():
+        raw = np.asarray(strings.astype(str).str.strip().to_numpy(), dtype="S9")
+    chars = raw.view(np.uint8).reshape(-1, 9)[:, :8].copy()
+    length = np.count_nonzero(raw.view(np.uint8).reshape(-1, 9), axis=1)
+    missing = length == 0
+
+    # Right-align "H:MM:SS" as "0H:MM:SS"
+    short = length == 7
+    chars[short, 1:] = chars[short, :7]
+    chars[short, 0] = ord("0")
+
+    digits = chars[:, _DIGITS].astype(np.int32) - ord("0")
+    bad = (
+        ((digits < 0) | (digits > 9)).any(axis=1)
+        | (chars[:, [2, 5]] != ord(":")).any(axis=1)
+        | (length < 7) | (length > 8)
+    ) & ~missing
+    if bad.any():
+        raise ValueError(f"malformed GTFS time {strings[bad].iloc[0]!r}")
+
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 2] * 10 + digits[:, 3]
+    seconds = hours * 3600 + minutes * 60 + digits[:, 4] * 10 + digits[:, 5]
+    seconds[missing] = -1
+    return seconds.astype(np.int32)
+
+
+def parse_gtfs_time_column(column: pd.Series) -> np.ndarray:
+    """
+    `parse_gtfs_times` for a table column. A Categorical column (as loaded
+    with `load_table(..., categorical=True)`) has each distinct time parsed
+    once and broadcast through its codes.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        parsed = np.append(parse_gtfs_times(column.cat.categories), np.int32(-1))
+        return parsed[codes]   # code -1 (missing) picks the trailing -1
+    return parse_gtfs_times(column)
+
+
+@dataclass
+class ScheduleIndex:
+    """
+    Departures of a GTFS feed, pre-joined and laid out for fast stop lookups.
+
+    Rows are sorted by (stop_id, departure_seconds); `stop_slices` maps each
+    stop to its [start, end) range in the column arrays, so finding the next
+    departures is a binary search plus a service-day mask. Whole-network
+    boards (`departure_board`, `minute_board`) work on all rows at once.
+
+    One index is shared by the API's request threads and every dashboard
+    session. The per-day caches are filled under a lock, and each entry
+    is fully built before it is published, so readers need no lock.
+    """
+    stop_id: np.ndarray
+    departure_seconds: np.ndarray   # int32 since service-day start, sorted within each stop
+    service_codes: np.ndarray       # int32 index into `services`
+    route_short_name: np.ndarray
+    trip_headsign: np.ndarray
+    departure_time: np.ndarray
+    stop_slices: dict[int, tuple[int, int]]
+    services: np.ndarray            # service_id per code
+    active_by_date: dict[int, np.ndarray]  # yyyymmdd → active service codes
+    _mask_cache: dict[int, np.ndarray] = field(default_factory=dict, repr=False)
+    _events_cache: dict[int, tuple[np.ndarray, np.ndarray]] = field(default_factory=dict, repr=False)
+    # Reentrant: day_events fills masks while holding it
+    _fill_lock: threading.RLock = field(default_factory=threading.RLock, repr=False)
+
+    def active_mask(self, date: int) -> np.ndarray:
+        """Boolean mask over service codes active on `date` (yyyymmdd)."""
+        mask = self._mask_cache.get(date)
+        if mask is None:
+            with self._fill_lock:
+                mask = self._mask_cache.get(date)
+                if mask is None:
+                    mask = np.zeros(len(self.services), dtype=bool)
+                    mask[self.active_by_date.get(date, [])] = True
+                    self._mask_cache[date] = mask
+        return mask
+
+    def _upcoming(self, start: int, end: int, after: int, date: int, limit: int) -> np.ndarray:
+        """First `limit` rows in [start, end) at or after `after` whose service runs on `date`."""
+        start += int(np.searchsorted(self.departure_seconds[start:end], after, side="left"))
+        active = self.active_mask(date)
+        return start + np.flatnonzero(active[self.service_codes[start:end]])[:limit]
+
+    def next_departures(
+        self,
+        stop_id: int,
+        reference_datetime: datetime,
+        limit: int = 10
+    ) -> pd.DataFrame:
+        """
+        Same contract as `get_next_departures`, answered from the index.
 
+        Trips of yesterday's service day that run past midnight (times of
+        24:00:00 and later) are merged in with today's, so a query at 00:30
+        sees the 24:45:00 departure of a service that only ran yesterday.
+        """
+        start, end = self.stop_slices.get(int(stop_id), (0, 0))
+        reference = reference_datetime.hour * 3600 + reference_datetime.minute * 60
+        today = reference_datetime.date()
+        yesterday = today - timedelta(days=1)
 
-def _parse_gtfs_time(time_str: str) -> int:
-    """Convert GTFS time string (HH:MM:SS, possibly >24h) to minutes since midnight."""
-    h, m, s = map(int, time_str.split(":"))
-    return h * 60 + m
+        from_today = self._upcoming(start, end, reference, int(today.strftime("%Y%m%d")), limit)
+        from_yesterday = self._upcoming(start, end, reference + SECONDS_PER_DAY,
+                                        int(yesterday.strftime("%Y%m%d")), limit)
+        rows = np.concatenate((from_today, from_yesterday))
+        # Seconds since today's midnight
+        due = self.departure_seconds[rows].astype(np.int64)
+        due[len(from_today):] -= SECONDS_PER_DAY
+        order = np.argsort(due, kind="stable")[:limit]
+        rows = rows[order]
+
+        return pd.DataFrame({
+            "route_short_name": self.route_short_name[rows],
+            "trip_headsign": self.trip_headsign[rows],
+            "departure_time": self.departure_time[rows],
+            "minutes_until": (due[order] - reference) // 60,
+        })
+
+    def day_events(self, day: date) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Every departure on calendar day `day` as (rows, seconds since that
+        day's midnight), sorted by stop and then time: the day's own
+        services plus yesterday's trips past 24:00:00. Cached per day.
+        """
+        key = int(day.strftime("%Y%m%d"))
+        events = self._events_cache.get(key)
+        if events is None:
+            with self._fill_lock:
+                events = self._events_cache.get(key)
+                if events is None:
+                    events = self._build_day_events(day, key)
+        return events
+
+    def _build_day_events(self, day: date, key: int) -> tuple[np.ndarray, np.ndarray]:
+        previous = int((day - timedelta(days=1)).strftime("%Y%m%d"))
+        own = np.flatnonzero(self.active_mask(key)[self.service_codes])
+        carried = np.flatnonzero(
+            self.active_mask(previous)[self.service_codes]
+            & (self.departure_seconds >= SECONDS_PER_DAY)
+        )
+        rows = np.concatenate((own, carried))
+        due = self.departure_seconds[rows].astype(np.int64)
+        due[len(own):] -= SECONDS_PER_DAY
+        # Stable, so ties keep the day's own services first, as in
+        # next_departures
+        order = np.lexsort((due, self.stop_id[rows]))
+        events = (rows[order], due[order])
+        # Publish a new dict rather than clearing the one readers may hold
+        cache = dict(self._events_cache) if len(self._events_cache) < 3 else {}
+        cache[key] = events
+        self._events_cache = cache
+        return events
+
+    def _day_events_for(self, day: date, stop_ids) -> tuple[np.ndarray, np.ndarray]:
+        rows, due = self.day_events(day)
+        if stop_ids is not None:
+            keep = np.isin(self.stop_id[rows], np.asarray(stop_ids, dtype=self.stop_id.dtype))
+            rows, due = rows[keep], due[keep]
+        return rows, due
+
+    def departure_board(
+        self,
+        reference_datetime: datetime,
+        stop_ids=None,
+        limit: int = 10
+    ) -> pd.DataFrame:
+        """
+        Next `limit` departures of every stop (or only `stop_ids`) after
+        `reference_datetime`, in one pass over the whole index.
+
+        Same columns as `next_departures` plus `stop_id` and `rank` (0 for
+        the next departure); rows are ordered by stop, then time, and each
+        stop's rows equal its `next_departures` result.
+        """
+        rows, due = self._day_events_for(reference_datetime.date(), stop_ids)
+        reference = reference_datetime.hour * 3600 + reference_datetime.minute * 60
+        upcoming = due >= reference
+        rows, due = rows[upcoming], due[upcoming]
+
+        rank = _rank_within_groups(self.stop_id[rows])
+        top = rank < limit
+        rows, due, rank = rows[top], due[top], rank[top]
+
+        return pd.DataFrame({
+            "stop_id": self.stop_id[rows],
+            "rank": rank,
+            "route_short_name": self.route_short_name[rows],
+            "trip_headsign": self.trip_headsign[rows],
+            "departure_time": self.departure_time[rows],
+            "minutes_until": (due - reference) // 60,
+        })
+
+    def minute_board(
+        self,
+        day: date,
+        stop_ids=None,
+        limit: int = 5,
+        start_minute: int = 0,
+        end_minute: int = 24 * 60,
+    ) -> pd.DataFrame:
+        """
+        Precomputed departure board for `day`: for every minute in
+        [start_minute, end_minute) and every stop (or only `stop_ids`), the
+        next `limit` departures.
+
+        Columns are `minute` (since midnight) followed by the
+        `departure_board` columns; rows are ordered by minute, stop and
+        rank. A full day for all stops runs to millions of rows, so the
+        string columns are Categoricals.
+        """
+        rows, due = self._day_events_for(day, stop_ids)
+        stops = self.stop_id[rows]
+        board_stops, first = np.unique(stops, return_index=True)
+        last = np.append(first[1:], len(stops))[:len(first)]
+        minutes = np.arange(start_minute, end_minute, dtype=np.int64)
+
+        # Events are sorted by (stop, time), so one searchsorted over
+        # (stop position, time) keys finds the next event for every
+        # (minute, stop) pair at once
+        span = max(int(due.max()) if len(due) else 0, end_minute * 60) + 1
+        position = np.repeat(np.arange(len(board_stops), dtype=np.int64), last - first)
+        keys = position * span + due
+        queries = np.arange(len(board_stops), dtype=np.int64)[None, :] * span + minutes[:, None] * 60
+        nxt = np.searchsorted(keys, queries.ravel())[:, None] + np.arange(limit)
+        valid = nxt < np.tile(last, len(minutes))[:, None]
+
+        picked = nxt[valid]
+        rows = rows[picked]
+        minute = np.repeat(np.repeat(minutes, len(board_stops)), valid.sum(axis=1))
+        rank = np.broadcast_to(np.arange(limit), valid.shape)[valid]
+
+        return pd.DataFrame({
+            "minute": minute.astype(np.int16),
+            "stop_id": self.stop_id[rows],
+            "rank": rank.astype(np.int16),
+            "route_short_name": _categorical(self.route_short_name, rows),
+            "trip_headsign": _categorical(self.trip_headsign, rows),
+            "departure_time": _categorical(self.departure_time, rows),
+            "minutes_until": ((due[picked] - minute * 60) // 60).astype(np.int32),
+        })
+
+
+def _rank_within_groups(keys: np.ndarray) -> np.ndarray:
+    """0, 1, 2, ... within each run of equal values in `keys`."""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return np.arange(len(keys)) - np.repeat(starts, np.diff(np.append(starts, len(keys))))
+
+
+def _categorical(values: np.ndarray, rows: np.ndarray) -> pd.Categorical:
+    codes, uniques = pd.factorize(values)
+    return pd.Categorical.from_codes(codes[rows], uniques)
+
+
+def build_schedule_index() -> ScheduleIndex:
+    """Load the GTFS feed once and build a `ScheduleIndex` from it."""
+    # Categorical, so each distinct departure_time is parsed once
+    stop_times = load_stop_times(categorical=True)[["trip_id", "stop_id", "departure_time"]]
+    trips = load_trips()
+    routes = load_routes()
+    calendar = load_calendar_dates()
+
+    stop_times = stop_times.assign(
+        departure_seconds=parse_gtfs_time_column(stop_times["departure_time"]),
+        trip_id=stop_times["trip_id"].astype(object),
+        departure_time=stop_times["departure_time"].astype(object),
+    )
+    schedule = stop_times.merge(
+        trips[["trip_id", "route_id", "service_id", "trip_headsign"]], on="trip_id"
+    )
+    schedule = schedule.merge(
+        routes[["route_id", "route_short_name"]],
+        on="route_id"
+    )
+    # Stops without a time (non-timepoints) cannot be looked up by time
+    schedule = schedule[schedule["departure_seconds"] >= 0]
+    schedule = schedule.sort_values(["stop_id", "departure_seconds"], kind="stable")
+
+    service_codes, services = pd.factorize(schedule["service_id"])
+    code_of = {service_id: code for code, service_id in enumerate(services)}
+
+    # Only services that actually stop somewhere matter for the mask
+    added = calendar[
+        (calendar["exception_type"] == 1) & calendar["service_id"].isin(code_of)
+    ]
+    active_by_date = {
+        int(date): np.array([code_of[s] for s in group], dtype=np.int32)
+        for date, group in added.groupby("date")["service_id"]
+    }
+
+    stop_ids = schedule["stop_id"].to_numpy()
+    boundaries = np.flatnonzero(np.diff(stop_ids)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(stop_ids)]))
+    stop_slices = {
+        int(stop_ids[s]): (int(s), int(e)) for s, e in zip(starts, ends)
+    } if len(stop_ids) else {}
+
+    return ScheduleIndex(
+        stop_id=stop_ids,
+        departure_seconds=schedule["departure_seconds"].to_numpy(dtype=np.int32),
+        service_codes=service_codes.astype(np.int32),
+        route_short_name=schedule["route_short_name"].astype(str).to_numpy(dtype=object),
+        trip_headsign=schedule["trip_headsign"].to_numpy(dtype=object),
+        departure_time=schedule["departure_time"].to_numpy(dtype=object),
+        stop_slices=stop_slices,
+        services=np.asarray(services, dtype=object),
+        active_by_date=active_by_date,
+    )
+
+
+@lru_cache(maxsize=1)
+def _cached_schedule_index(gtfs_dir: Path, feed: str) -> ScheduleIndex:
+    return build_schedule_index()
+
+
+def get_schedule_index() -> ScheduleIndex:
+    """
+    Process-wide `ScheduleIndex` for the current feed.
+
+    Built on first use and shared by every caller (and so every Streamlit
+    session); rebuilt only when the feed hash changes.
+    """
+    return _cached_schedule_index(GTFS_DIR, feed_hash())
 
 
 def get_next_departures(
@@ -37,50 +378,32 @@ def get_next_departures(
     - departure_time: Original GTFS time string
     - minutes_until: Minutes from now until departure
     """
-    # Load data
-    stop_times = load_stop_times()
-    trips = load_trips()
-    routes = load_routes()
-    calendar = load_calendar_dates()
-    
-    # Filter by stop
-    stop_schedule = stop_times[stop_times["stop_id"] == stop_id].copy()
-    
-    # Join to get route and service info
-    stop_schedule = stop_schedule.merge(trips, on="trip_id")
-    stop_schedule = stop_schedule.merge(
-        routes[["route_id", "route_short_name", "route_color"]], 
-        on="route_id"
-    )
-    
-    # Filter by service active on reference date
-    date_str = reference_datetime.strftime("%Y%m%d")
-    active_services = calendar[
-        (calendar["date"] == int(date_str)) & (calendar["exception_type"] == 1)
-    ]["service_id"].unique()
-    
-    stop_schedule = stop_schedule[stop_schedule["service_id"].isin(active_services)]
-    
-    # Convert times to minutes since midnight
-    stop_schedule["departure_minutes"] = stop_schedule["departure_time"].apply(_parse_gtfs_time)
-    reference_minutes = reference_datetime.hour * 60 + reference_datetime.minute
-    
-    # Handle overnight times: if departure > 24h, it's for "tomorrow" in GTFS terms
-    # but we're querying for "today", so skip those unless we're past midnight
-    stop_schedule["minutes_until"] = stop_schedule["departure_minutes"] - reference_minutes
-    
-    # Filter future departures only
-    upcoming = stop_schedule[stop_schedule["minutes_until"] >= 0].copy()
-    
-    # Sort and limit
-    upcoming = upcoming.sort_values("minutes_until").head(limit)
-    
-    return upcoming[[
-        "route_short_name", 
-        "trip_headsign", 
-        "departure_time",
-        "minutes_until"
-    ]]
+    return get_schedule_index().next_departures(stop_id, reference_datetime, limit)
+
+
+def get_departure_board(
+    reference_datetime: datetime,
+    stop_ids=None,
+    limit: int = 10
+) -> pd.DataFrame:
+    """
+    Next N departures of every stop (or of `stop_ids`) at once.
+
+    Same columns as `get_next_departures` plus stop_id and rank; see
+    `ScheduleIndex.departure_board`.
+    """
+    return get_schedule_index().departure_board(reference_datetime, stop_ids, limit)
+
+
+def get_minute_board(
+    day: date,
+    stop_ids=None,
+    limit: int = 5,
+    start_minute: int = 0,
+    end_minute: int = 24 * 60,
+) -> pd.DataFrame:
+    """Per-minute departure board for `day`; see `ScheduleIndex.minute_board`."""
+    return get_schedule_index().minute_board(day, stop_ids, limit, start_minute, end_minute)
 
 
 if __name__ == "__main__":
@@ -96,3 +419,14 @@ if __name__ == "__main__":
     departures = get_next_departures(sample_stop, test_time, limit=5)
     print(f"\nNext 5 departures from stop {sample_stop} after {test_time.strftime('%H:%M')}:")
     print(departures.to_string(index=False))
+
+    import time as timer
+    t0 = timer.perf_counter()
+    board = get_departure_board(test_time, limit=5)
+    print(f"\nBoard for {board['stop_id'].nunique()} stops: {len(board)} rows "
+          f"in {1000 * (timer.perf_counter() - t0):.1f} ms")
+    t0 = timer.perf_counter()
+    minutes = get_minute_board(test_time.date(), limit=5)
+    print(f"Minute board for {test_time.date()}: {len(minutes)} rows, "
+          f"{minutes.memory_usage(deep=True).sum() / 2**20:.0f} MiB "
+          f"in {timer.perf_counter() - t0:.2f} s")
@@ -1,16 +1,36 @@
 # src/pulsetransit/db.py
 import sqlite3
+from datetime import datetime, timezone
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent.parent.parent / "data" / "tus.db"
 
+INDEXES = [
+    ("idx_est_parada", "estimaciones", "parada_id"),
+    ("idx_est_linea", "estimaciones", "linea"),
+    ("idx_est_arrival", "estimaciones", "predicted_arrival"),
+    # Not in schema.sql: backs MAX(collected_at) for the freshness metadata
+    ("idx_est_collected", "estimaciones", "collected_at"),
+    ("idx_pos_instant", "posiciones", "instante"),
+    ("idx_pos_linea", "posiciones", "linea"),
+    ("idx_pos_vehiculo", "posiciones", "vehiculo"),
+]
+
+# Column that says how fresh each table is; both are indexed
+FRESHNESS_COLUMNS = {"estimaciones": "collected_at", "posiciones": "instante"}
+
 def get_connection():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
+    # WAL + NORMAL: one fsync per checkpoint instead of per commit, and
+    # readers (validate, dashboard) don't block the collector
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
-def init_db(conn):
+def create_tables(conn):
+    """The raw data tables alone, without indexes or metadata."""
     conn.execute("""
         CREATE TABLE IF NOT EXISTS estimaciones (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,4 +62,81 @@ def init_db(conn):
             UNIQUE(vehiculo, instante)
         )
     """)
+
+def init_db(conn):
+    create_tables(conn)
+    create_indexes(conn)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_meta (
+            dataset TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            last_time TEXT,
+            last_run_at TEXT,
+            last_run_ms REAL,
+            last_inserted INTEGER
+        )
+    """)
+    for table, col in FRESHNESS_COLUMNS.items():
+        if not conn.execute("SELECT 1 FROM ingest_meta WHERE dataset = ?", (table,)).fetchone():
+            # One-off full scan to seed the counters of an existing database
+            conn.execute(
+                f"INSERT INTO ingest_meta (dataset, row_count, last_time) "
+                f"SELECT ?, COUNT(*), MAX({col}) FROM {table}", (table,)
+            )
+    conn.commit()
+
+def count_inserted(conn, dataset, inserted):
+    """
+    Add `inserted` to the dataset's `ingest_meta` row count. Caller commits,
+    in the same transaction as the rows, so the count never falls behind.
+    """
+    conn.execute(
+        "UPDATE ingest_meta SET row_count = row_count + ? WHERE dataset = ?",
+        (inserted, dataset),
+    )
+
+def record_ingest(conn, dataset, inserted, elapsed, run_at):
+    """
+    Update `ingest_meta` after a collector run. The latest timestamp comes
+    from an index-backed MAX, so this stays O(log n). The row count is
+    kept by `count_inserted`, inside the insert transactions.
+    """
+    col = FRESHNESS_COLUMNS[dataset]
+    with conn:
+        conn.execute(f"""
+            UPDATE ingest_meta SET
+                last_time = (SELECT MAX({col}) FROM {dataset}),
+                last_run_at = ?,
+                last_run_ms = ?,
+                last_inserted = ?
+            WHERE dataset = ?
+        """, (run_at, elapsed * 1000, inserted, dataset))
+
+def init_pipeline_state(conn):
+    """Watermarks of the derived-table stages (delays, arrivals)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_state (
+            stage TEXT PRIMARY KEY,
+            high_water INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
     conn.commit()
+
+def watermark(conn, stage):
+    row = conn.execute(
+        "SELECT high_water FROM pipeline_state WHERE stage = ?", (stage,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def set_watermark(conn, stage, high_water):
+    """Caller commits, usually together with the rows the mark covers."""
+    conn.execute(
+        "INSERT OR REPLACE INTO pipeline_state VALUES (?, ?, ?)",
+        (stage, high_water, datetime.now(timezone.utc).isoformat()),
+    )
+
+def create_indexes(conn):
+    """Same secondary indexes as the worker's schema.sql."""
+    for name, table, column in INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({column})")
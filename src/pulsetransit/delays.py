@@ -0,0 +1,238 @@
+# src/pulsetransit/delays.py
+"""
+Delay facts: estimaciones predictions matched to the GTFS schedule.
+
+Each prediction (`parada_id`, `linea`, `predicted_arrival`) is matched
+to the closest scheduled departure of that route at that stop, on the
+service day the arrival falls in (including yesterday's trips past
+24:00:00), and written to the `delays` table with the delay in seconds.
+Predictions with no scheduled departure within `MATCH_WINDOW_S` are
+skipped.
+
+The stage is incremental: a watermark in `pipeline_state` records the
+last estimaciones id processed, and each batch commits together with
+its watermark, so an interrupted run can simply be rerun. Matching is
+a searchsorted over the schedule index, not a pandas merge.
+
+    python -m pulsetransit.delays               # process new rows once
+    python -m pulsetransit.delays --every 120   # keep up with the collector
+"""
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from pulsetransit.dashboard.schedules import SECONDS_PER_DAY, ScheduleIndex, get_schedule_index
+from pulsetransit.db import get_connection, init_db, init_pipeline_state, set_watermark, watermark
+
+TZ = "Europe/Madrid"
+STAGE = "delays"
+BATCH_SIZE = 20_000
+MATCH_WINDOW_S = 30 * 60
+
+# Keys pack (stop, route, seconds); seconds since a day's midnight stay
+# below two days even for trips running past 24:00:00
+_SPAN = 2 * SECONDS_PER_DAY
+
+DELAYS_SQL = """
+    INSERT OR REPLACE INTO delays
+        (estimacion_id, parada_id, linea, service_date, scheduled_time,
+         predicted_arrival, delay_s)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def init_delays(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS delays (
+            estimacion_id INTEGER PRIMARY KEY,
+            parada_id INTEGER NOT NULL,
+            linea TEXT NOT NULL,
+            service_date TEXT NOT NULL,
+            scheduled_time TEXT NOT NULL,
+            predicted_arrival TEXT NOT NULL,
+            delay_s INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_delays_parada ON delays(parada_id, service_date)")
+    init_pipeline_state(conn)
+
+
+class DelayMatcher:
+    """
+    Nearest scheduled departure per (stop, route, local time).
+
+    Events of each calendar day are packed into sorted int64 keys
+    (stop, route, seconds since midnight), so a batch of predictions is
+    matched with one searchsorted per day.
+    """
+
+    def __init__(self, index: ScheduleIndex, window_s: int = MATCH_WINDOW_S):
+        self.index = index
+        self.window_s = window_s
+        self.route_codes, routes = pd.factorize(index.route_short_name)
+        self.route_code_of = {str(r): i for i, r in enumerate(routes)}
+        self._days: dict[date, tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def _group(self, stop_ids, route_codes):
+        return np.asarray(stop_ids, dtype=np.int64) * len(self.route_code_of) + route_codes
+
+    def _day(self, day: date):
+        """(sorted keys, rows, due) for every departure on calendar day `day`."""
+        cached = self._days.get(day)
+        if cached is None:
+            rows, due = self.index.day_events(day)
+            keys = self._group(self.index.stop_id[rows], self.route_codes[rows]) * _SPAN + due
+            order = np.argsort(keys, kind="stable")
+            cached = (keys[order], rows[order], due[order])
+            if len(self._days) >= 4:
+                self._days.clear()
+            self._days[day] = cached
+        return cached
+
+    def _nearest(self, day, groups, seconds):
+        """
+        Closest event of `day` in the same group, as (rows, due, gap);
+        rows are -1 where the group has no events that day.
+        """
+        keys, rows, due = self._day(day)
+        n = len(groups)
+        best_row = np.full(n, -1, dtype=np.int64)
+        best_due = np.zeros(n, dtype=np.int64)
+        best_gap = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        if len(keys) == 0:
+            return best_row, best_due, best_gap
+        pos = np.searchsorted(keys, groups * _SPAN + seconds)
+        for candidate in (pos - 1, pos):
+            c = np.clip(candidate, 0, len(keys) - 1)
+            same = (candidate >= 0) & (candidate < len(keys)) & (keys[c] // _SPAN == groups)
+            gap = np.abs(seconds - due[c])
+            better = same & (gap < best_gap)
+            best_row[better] = rows[c[better]]
+            best_due[better] = due[c[better]]
+            best_gap[better] = gap[better]
+        return best_row, best_due, best_gap
+
+    def match(self, stop_ids, lines, arrivals: pd.Series) -> pd.DataFrame:
+        """
+        Match predictions to the schedule.
+
+        `arrivals` are tz-aware timestamps. Returns one row per input with
+        the matched index row (-1 if none), `delay_s` (arrival minus
+        scheduled time) and the GTFS `service_date` of the matched trip.
+        """
+        local = arrivals.dt.tz_convert(TZ)
+        valid = local.notna().to_numpy()
+        seconds = (local.dt.hour * 3600 + local.dt.minute * 60 + local.dt.second)
+        seconds = seconds.to_numpy(dtype=np.float64, na_value=0).astype(np.int64)
+        days = local.dt.tz_localize(None).dt.normalize().to_numpy(dtype="datetime64[D]")
+        route_codes = np.array([self.route_code_of.get(str(l), -1) for l in lines], dtype=np.int64)
+        groups = self._group(stop_ids, route_codes)
+
+        row = np.full(len(groups), -1, dtype=np.int64)
+        delay = np.zeros(len(groups), dtype=np.int64)
+        service_day = np.zeros(len(groups), dtype="datetime64[D]")
+        for day in np.unique(days[valid & (route_codes >= 0)]):
+            sel = np.flatnonzero(valid & (route_codes >= 0) & (days == day))
+            today = day.astype(date)
+            # The arrival's own calendar day, and the day before for trips
+            # scheduled just before midnight that arrive just after it
+            found, due, gap = self._nearest(today, groups[sel], seconds[sel])
+            prev_found, prev_due, prev_gap = self._nearest(
+                today - timedelta(days=1), groups[sel], seconds[sel] + SECONDS_PER_DAY)
+            use_prev = prev_gap < gap
+            found = np.where(use_prev, prev_found, found)
+            due = np.where(use_prev, prev_due - SECONDS_PER_DAY, due)
+            gap = np.minimum(gap, prev_gap)
+
+            matched = (found >= 0) & (gap <= self.window_s)
+            hit = sel[matched]
+            row[hit] = found[matched]
+            delay[hit] = seconds[hit] - due[matched]
+            # A scheduled time of 24:00:00 or later belongs to the service
+            # day before the calendar day it falls on
+            days_back = (self.index.departure_seconds[found[matched]] - due[matched]) // SECONDS_PER_DAY
+            service_day[hit] = day - days_back.astype("timedelta64[D]")
+
+        return pd.DataFrame({
+            "row": row,
+            "delay_s": delay,
+            "service_date": np.datetime_as_string(service_day, unit="D"),
+        })
+
+
+def process_batch(conn, matcher: DelayMatcher, batch: pd.DataFrame) -> int:
+    """Match one batch of estimaciones rows and write their delays; returns rows written."""
+    arrivals = pd.to_datetime(batch["predicted_arrival"], format="ISO8601", utc=True, errors="coerce")
+    result = matcher.match(batch["parada_id"].fillna(-1).to_numpy(), batch["linea"], arrivals)
+    ok = result["row"].to_numpy() >= 0
+    rows = result["row"].to_numpy()[ok]
+    facts = zip(
+        batch["id"].to_numpy()[ok].tolist(),
+        batch["parada_id"].to_numpy()[ok].tolist(),
+        batch["linea"].to_numpy()[ok].tolist(),
+        result["service_date"].to_numpy()[ok].tolist(),
+        matcher.index.departure_time[rows].tolist(),
+        batch["predicted_arrival"].to_numpy()[ok].tolist(),
+        result["delay_s"].to_numpy()[ok].tolist(),
+    )
+    conn.executemany(DELAYS_SQL, facts)
+    return int(ok.sum())
+
+
+def run(conn=None, matcher: DelayMatcher | None = None, batch_size=BATCH_SIZE) -> tuple[int, int]:
+    """
+    Process estimaciones rows past the watermark. Returns (rows read,
+    delays written).
+    """
+    own_conn = conn is None
+    conn = conn or get_connection()
+    init_db(conn)
+    init_delays(conn)
+    matcher = matcher or DelayMatcher(get_schedule_index())
+    read = written = 0
+    try:
+        mark = watermark(conn, STAGE)
+        while True:
+            batch = pd.read_sql_query(
+                "SELECT id, parada_id, linea, predicted_arrival FROM estimaciones "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                conn, params=(mark, batch_size),
+            )
+            if batch.empty:
+                break
+            mark = int(batch["id"].iloc[-1])
+            # The facts and their watermark commit together
+            with conn:
+                written += process_batch(conn, matcher, batch)
+                set_watermark(conn, STAGE, mark)
+            read += len(batch)
+            if len(batch) < batch_size:
+                break
+    finally:
+        if own_conn:
+            conn.close()
+    return read, written
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--every", type=float, metavar="SECONDS",
+                        help="keep running, processing new rows at this interval")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    matcher = None
+    while True:
+        t0 = time.perf_counter()
+        index = get_schedule_index()
+        # Kept across rounds, rebuilt when a new GTFS feed is picked up
+        if matcher is None or matcher.index is not index:
+            matcher = DelayMatcher(index)
+        read, written = run(matcher=matcher, batch_size=args.batch_size)
+        print(f"  {read} estimaciones → {written} delays ({time.perf_counter() - t0:.2f}s)")
+        if not args.every:
+            break
+        time.sleep(args.every)
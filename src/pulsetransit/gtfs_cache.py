@@ -0,0 +1,151 @@
+# src/pulsetransit/gtfs_cache.py
+"""
+Binary columnar cache of the static GTFS feed.
+
+Each GTFS table is compiled once into one .npy file per column: numeric
+columns are stored as-is, string columns as int32 codes plus a JSON
+dictionary. The cache lives in a directory named after a hash of the
+source files, so replacing the NAP feed triggers a rebuild on next load.
+Numeric columns and string codes are memory-mapped, not parsed.
+
+    python -m pulsetransit.gtfs_cache   # compile ahead of time
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+GTFS_DIR = Path("data/gtfs-static")
+CACHE_DIR = Path("data/gtfs-cache")
+FORMAT_VERSION = 1
+
+_hash_memo: dict[Path, tuple[tuple, str]] = {}
+
+
+def _source_files(gtfs_dir: Path) -> list[Path]:
+    return sorted(gtfs_dir.glob("*.txt"))
+
+
+def feed_hash(gtfs_dir: Path = GTFS_DIR) -> str:
+    """
+    Content hash of the feed's .txt files.
+
+    Hashing is memoised on (name, size, mtime) so repeated calls within a
+    process only stat the files.
+    """
+    files = _source_files(gtfs_dir)
+    signature = tuple((f.name, f.stat().st_size, f.stat().st_mtime_ns) for f in files)
+    memo = _hash_memo.get(gtfs_dir)
+    if memo and memo[0] == signature:
+        return memo[1]
+
+    h = hashlib.sha256(f"v{FORMAT_VERSION}".encode())
+    for f in files:
+        h.update(f.name.encode())
+        with open(f, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                h.update(chunk)
+    digest = h.hexdigest()[:16]
+    _hash_memo[gtfs_dir] = (signature, digest)
+    return digest
+
+
+def _write_table(df: pd.DataFrame, out_dir: Path) -> None:
+    out_dir.mkdir(parents=True)
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            np.save(out_dir / f"{i}.npy", series.to_numpy())
+            columns.append({"name": col, "kind": "numeric"})
+        else:
+            codes, uniques = pd.factorize(series)
+            np.save(out_dir / f"{i}.npy", codes.astype(np.int32))
+            columns.append({
+                "name": col,
+                "kind": "dictionary",
+                "dictionary": [str(u) for u in uniques],
+            })
+    (out_dir / "meta.json").write_text(
+        json.dumps({"rows": len(df), "columns": columns}, ensure_ascii=False),
+        encoding="utf-8",
+    )
+
+
+def compile_feed(gtfs_dir: Path = GTFS_DIR, cache_dir: Path = CACHE_DIR) -> Path:
+    """
+    Compile every table in `gtfs_dir` into `cache_dir/<feed hash>/`.
+
+    No-op if that cache already exists. Stale caches from earlier feeds are
+    removed once the new one is in place.
+    """
+    target = cache_dir / feed_hash(gtfs_dir)
+    if target.exists():
+        return target
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Build in a scratch dir and rename, so concurrent loaders never see
+    # a half-written cache
+    tmp = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".build-"))
+    try:
+        for f in _source_files(gtfs_dir):
+            _write_table(pd.read_csv(f), tmp / f.stem)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            if not target.exists():
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for old in cache_dir.iterdir():
+        if old != target and not old.name.startswith("."):
+            shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+def load_table(
+    name: str,
+    gtfs_dir: Path = GTFS_DIR,
+    cache_dir: Path = CACHE_DIR,
+    categorical: bool = False,
+) -> pd.DataFrame:
+    """
+    Load a GTFS table (e.g. "stops") from the binary cache, compiling it first
+    if the feed changed.
+
+    Numeric columns are read-only memory maps. String columns are decoded
+    to plain object columns, or kept as pandas Categoricals over the stored
+    codes if `categorical` is set.
+    """
+    table_dir = compile_feed(gtfs_dir, cache_dir) / name
+    if not table_dir.exists():
+        raise FileNotFoundError(gtfs_dir / f"{name}.txt")
+
+    meta = json.loads((table_dir / "meta.json").read_text(encoding="utf-8"))
+    data = {}
+    for i, col in enumerate(meta["columns"]):
+        values = np.load(table_dir / f"{i}.npy", mmap_mode="r")
+        if col["kind"] == "dictionary":
+            values = pd.Categorical.from_codes(values, categories=col["dictionary"])
+            if not categorical:
+                values = np.asarray(values, dtype=object)
+        data[col["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+if __name__ == "__main__":
+    import time
+    t0 = time.perf_counter()
+    path = compile_feed()
+    print(f"GTFS cache at {path} ({time.perf_counter() - t0:.2f}s)")
+    for table_dir in sorted(path.iterdir()):
+        t0 = time.perf_counter()
+        df = load_table(table_dir.name)
+        size = sum(f.stat().st_size for f in table_dir.iterdir())
+        print(f"  {table_dir.name:<16} {len(df):>7} rows  {size / 1024:>8.1f} KiB  "
+              f"load {1000 * (time.perf_counter() - t0):.1f} ms")
@@ -0,0 +1,141 @@
+# src/pulsetransit/live.py
+"""
+Latest position of every bus, kept up to date incrementally.
+
+`LivePositions` remembers the newest `instante` it has read and only
+asks `posiciones` for rows from that point on (backed by
+idx_pos_instant), folding them into an in-memory table with one row per
+`vehiculo`. A refresh therefore costs in proportion to the fixes stored
+since the previous one, not to the size of the history; a cold start
+reads back only `STALE_AFTER_S` from the newest fix. Buses without a fix
+in the last `STALE_AFTER_S` of wall-clock time are dropped, so a stalled
+collector or an old database shows no buses rather than stale ones.
+posiciones only arrive once per collection interval, so that window
+spans a whole interval plus some slack.
+
+One instance is shared by every dashboard session; concurrent refreshes
+are serialised and rate-limited to `REFRESH_S`.
+
+    live = get_live_positions()
+    vehicles = live.snapshot()        # refreshes if due
+"""
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from pulsetransit.collector import POSICIONES_INTERVAL_S
+from pulsetransit.db import DB_PATH
+
+REFRESH_S = 15
+# Buses without a fix for this long have left service (or the collector
+# stalled): one posiciones pull interval, plus slack for a late pull
+STALE_AFTER_S = POSICIONES_INTERVAL_S + 15 * 60
+
+COLUMNS = ["vehiculo", "linea", "lat", "lon", "velocidad", "instante"]
+
+NEW_FIXES_SQL = f"""
+    SELECT {", ".join(COLUMNS)} FROM posiciones
+    WHERE instante >= ? AND vehiculo IS NOT NULL
+      AND lat IS NOT NULL AND lon IS NOT NULL
+    ORDER BY instante
+"""
+
+
+def text_cutoff(newest: str, seconds: float) -> str:
+    """
+    ISO timestamp `seconds` before `newest`, for comparing against stored
+    text: a bare 'YYYY-MM-DDTHH:MM:SS' sorts before any stored value with
+    that prefix, whatever offset or fraction follows it.
+    """
+    cutoff = pd.Timestamp(newest) - pd.Timedelta(seconds=seconds)
+    return cutoff.strftime(f"%Y-%m-%d{newest[10]}%H:%M:%S")
+
+
+class LivePositions:
+    """Latest fix per vehicle, refreshed from `posiciones` incrementally."""
+
+    def __init__(self, db_path: Path = DB_PATH, stale_after_s: int = STALE_AFTER_S):
+        self.db_path = Path(db_path)
+        self.stale_after_s = stale_after_s
+        self.since = ""  # newest instante seen; '' sorts before every timestamp
+        self.latest = pd.DataFrame({c: pd.Series(dtype=d) for c, d in (
+            ("vehiculo", "int64"), ("linea", "Int64"), ("lat", "float64"),
+            ("lon", "float64"), ("velocidad", "Int64"), ("instante", "str"),
+        )}).set_index("vehiculo")
+        self.refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _start(self, conn) -> str:
+        """
+        Where a cold start reads from: `stale_after_s` before the newest
+        fix, so the first refresh skips the history too.
+        """
+        newest = conn.execute("SELECT MAX(instante) FROM posiciones").fetchone()[0]
+        return text_cutoff(newest, self.stale_after_s) if newest else ""
+
+    def _read_new(self) -> pd.DataFrame:
+        if not self.db_path.exists():
+            return self.latest.iloc[:0].reset_index()
+        # Read-only: the dashboard never writes and never waits on the collector
+        with sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True) as conn:
+            if not self.since:
+                self.since = self._start(conn)
+            # `>=` re-reads the newest instante, which may have gained rows
+            # from another vehicle since; the merge below is idempotent
+            return pd.read_sql_query(NEW_FIXES_SQL, conn, params=(self.since,))
+
+    def refresh(self, max_age_s: float = 0) -> int:
+        """
+        Fold fixes stored since the last refresh into `latest`; returns rows
+        read. Does nothing if the last refresh is younger than `max_age_s`,
+        checked under the lock so callers queued behind a refresh reuse it.
+        """
+        with self._lock:
+            if time.monotonic() - self.refreshed_at < max_age_s:
+                return 0
+            fixes = self._read_new()
+            self.refreshed_at = time.monotonic()
+            if fixes.empty:
+                self.latest = self._drop_stale(self.latest)
+                return 0
+            # Sorted by instante, so the last row per vehicle is its newest
+            fresh = fixes.drop_duplicates("vehiculo", keep="last").set_index("vehiculo")
+            fresh = fresh.astype(self.latest.dtypes.to_dict())
+            kept = self.latest[~self.latest.index.isin(fresh.index)]
+            latest = pd.concat([kept, fresh]) if len(kept) else fresh
+            self.since = str(fixes["instante"].iloc[-1])
+            self.latest = self._drop_stale(latest)
+            return len(fixes)
+
+    def _drop_stale(self, latest: pd.DataFrame) -> pd.DataFrame:
+        instants = pd.to_datetime(latest["instante"], format="ISO8601", utc=True, errors="coerce")
+        cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(seconds=self.stale_after_s)
+        return latest[instants >= cutoff]
+
+    def snapshot(self, max_age_s: float = REFRESH_S) -> pd.DataFrame:
+        """
+        Current positions (vehiculo, linea, lat, lon, velocidad, instante),
+        refreshing first if the last refresh is older than `max_age_s`.
+        """
+        if time.monotonic() - self.refreshed_at >= max_age_s:
+            self.refresh(max_age_s)
+        return self.latest.reset_index()
+
+
+@lru_cache(maxsize=1)
+def get_live_positions() -> LivePositions:
+    """Process-wide `LivePositions` over the local database."""
+    return LivePositions()
+
+
+if __name__ == "__main__":
+    live = LivePositions()
+    for label in ("cold", "warm"):
+        t0 = time.perf_counter()
+        read = live.refresh()
+        print(f"{label}: {read} new fixes, {len(live.latest)} vehicles "
+              f"({(time.perf_counter() - t0) * 1000:.1f} ms)")
@@ -0,0 +1,232 @@
+# src/pulsetransit/partitions.py
+"""
+Daily partitions and retention for estimaciones/posiciones.
+
+The collector keeps writing to `data/tus.db`, which becomes the hot
+partition: `rotate` moves every row collected before today (UTC) into
+one SQLite file per day under `data/partitions/`, and `compact` rolls
+daily files older than a cutoff into zstd-compressed Parquet. `query`
+reads a time range from all three tiers, only opening the days that
+overlap it.
+
+Rows are partitioned by `collected_at`, and keep their `id` from the
+hot database. Partition files hold just the data tables, without
+secondary indexes or metadata. UNIQUE constraints hold per partition
+only: the API re-serves recent history after midnight, so the same fix
+or prediction can be stored on two days, and `query` drops the repeats.
+
+    python -m pulsetransit.partitions rotate
+    python -m pulsetransit.partitions compact --older-than 30
+"""
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from pulsetransit.db import DB_PATH, create_tables, get_connection, init_db
+
+PARTITION_DIR = DB_PATH.parent / "partitions"
+TABLES = ("estimaciones", "posiciones")
+# The tables' UNIQUE constraints
+UNIQUE_KEYS = {
+    "estimaciones": ["parada_id", "linea", "fech_actual"],
+    "posiciones": ["vehiculo", "instante"],
+}
+COMPACT_AFTER_DAYS = 30
+
+
+def partition_path(day: date) -> Path:
+    return PARTITION_DIR / f"tus-{day.isoformat()}.db"
+
+
+def parquet_path(table: str, day: date) -> Path:
+    return PARTITION_DIR / "parquet" / table / f"{day.isoformat()}.parquet"
+
+
+def _day_of(path: Path) -> date:
+    return date.fromisoformat(path.stem.removeprefix("tus-"))
+
+
+def sqlite_partitions() -> dict[date, Path]:
+    return {_day_of(p): p for p in sorted(PARTITION_DIR.glob("tus-*.db"))}
+
+
+def parquet_partitions(table: str) -> dict[date, Path]:
+    return {_day_of(p): p for p in sorted((PARTITION_DIR / "parquet" / table).glob("*.parquet"))}
+
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def rotate(conn=None, today: date | None = None) -> dict[date, int]:
+    """
+    Move rows collected before `today` (UTC) out of the hot database into
+    their daily partition files. Returns rows moved per day.
+
+    Each day is moved in its own transaction, so an interrupted rotation
+    can simply be rerun.
+    """
+    own_conn = conn is None
+    conn = conn or get_connection()
+    init_db(conn)
+    today = today or datetime.now(timezone.utc).date()
+    moved = {}
+    try:
+        days = [
+            date.fromisoformat(r[0])
+            for r in conn.execute(
+                " UNION ".join(
+                    f"SELECT DISTINCT substr(collected_at, 1, 10) FROM {t} WHERE collected_at < ?"
+                    for t in TABLES
+                ),
+                (today.isoformat(),) * len(TABLES),
+            )
+        ]
+        PARTITION_DIR.mkdir(parents=True, exist_ok=True)
+        for day in sorted(days):
+            path = partition_path(day)
+            with sqlite3.connect(path) as part:
+                create_tables(part)
+            part.close()
+
+            bounds = (day.isoformat(), (day + timedelta(days=1)).isoformat())
+            conn.execute("ATTACH DATABASE ? AS part", (str(path),))
+            try:
+                with conn:
+                    count = 0
+                    for table in TABLES:
+                        cols = ", ".join(_columns(conn, table))
+                        where = "WHERE collected_at >= ? AND collected_at < ?"
+                        before = conn.total_changes
+                        conn.execute(
+                            f"INSERT OR IGNORE INTO part.{table} ({cols}) "
+                            f"SELECT {cols} FROM main.{table} {where}", bounds
+                        )
+                        count += conn.total_changes - before
+                        deleted = conn.execute(
+                            f"DELETE FROM main.{table} {where}", bounds
+                        ).rowcount
+                        # ingest_meta counts rows still in the hot database
+                        conn.execute(
+                            "UPDATE main.ingest_meta SET row_count = row_count - ? WHERE dataset = ?",
+                            (deleted, table),
+                        )
+                moved[day] = count
+            finally:
+                conn.execute("DETACH DATABASE part")
+    finally:
+        if own_conn:
+            conn.close()
+    return moved
+
+
+def compact(older_than_days: int = COMPACT_AFTER_DAYS, today: date | None = None) -> list[date]:
+    """
+    Convert daily SQLite partitions older than `older_than_days` into one
+    Parquet file per table and day, then delete the SQLite file.
+
+    Needs pyarrow (`pip install pulsetransit[parquet]`).
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("compact() needs pyarrow: pip install pulsetransit[parquet]") from e
+
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = today - timedelta(days=older_than_days)
+    compacted = []
+    for day, path in sqlite_partitions().items():
+        if day >= cutoff:
+            continue
+        with sqlite3.connect(path) as part:
+            for table in TABLES:
+                out = parquet_path(table, day)
+                out.parent.mkdir(parents=True, exist_ok=True)
+                df = pd.read_sql_query(f"SELECT * FROM {table} ORDER BY id", part)
+                tmp = out.with_suffix(".tmp")
+                df.to_parquet(tmp, compression="zstd", index=False)
+                tmp.replace(out)
+        part.close()
+        path.unlink()
+        compacted.append(day)
+    return compacted
+
+
+def _as_utc(ts) -> datetime:
+    ts = pd.Timestamp(ts)
+    return (ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")).to_pydatetime()
+
+
+def query(
+    table: str,
+    start,
+    end,
+    columns: list[str] | None = None,
+    conn=None,
+) -> pd.DataFrame:
+    """
+    Rows of `table` with `start <= collected_at < end`, from the hot
+    database, daily SQLite partitions and Parquet files.
+
+    Only partitions whose day overlaps the range are opened. Rows stored
+    on more than one day (same UNIQUE key) are returned once, from the
+    earliest day. Naive timestamps are taken as UTC.
+    """
+    if table not in TABLES:
+        raise ValueError(f"unknown table {table!r}")
+    start, end = _as_utc(start), _as_utc(end)
+    lo, hi = start.isoformat(), end.isoformat()
+    first, last = start.date(), end.date()
+    key = UNIQUE_KEYS[table]
+    # The key columns are needed to drop repeats even if not asked for
+    fetch = columns and list(dict.fromkeys([*columns, *key]))
+    select = ", ".join(fetch) if fetch else "*"
+    sql = f"SELECT {select} FROM {table} WHERE collected_at >= ? AND collected_at < ?"
+
+    frames = []
+    for day, path in parquet_partitions(table).items():
+        if first <= day <= last:
+            df = pd.read_parquet(path, columns=fetch and list({*fetch, "collected_at"}))
+            df = df[(df["collected_at"] >= lo) & (df["collected_at"] < hi)]
+            frames.append(df[fetch] if fetch else df)
+    for day, path in sqlite_partitions().items():
+        if first <= day <= last:
+            with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as part:
+                frames.append(pd.read_sql_query(sql, part, params=(lo, hi)))
+            part.close()
+
+    own_conn = conn is None
+    conn = conn or get_connection()
+    try:
+        frames.append(pd.read_sql_query(sql, conn, params=(lo, hi)))
+    finally:
+        if own_conn:
+            conn.close()
+
+    frames = [f for f in frames if not f.empty] or frames[-1:]
+    df = pd.concat(frames, ignore_index=True)
+    # Frames are in day order, so the first copy is the earliest. SQLite
+    # never treats NULL keys as equal, so neither do we
+    repeated = df.duplicated(key) & df[key].notna().all(axis=1)
+    if repeated.any():
+        df = df[~repeated].reset_index(drop=True)
+    return df[columns] if columns else df
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rotate", help="move rows before today into daily partitions")
+    p = sub.add_parser("compact", help="roll old daily partitions into Parquet")
+    p.add_argument("--older-than", type=int, default=COMPACT_AFTER_DAYS, metavar="DAYS")
+    args = parser.parse_args()
+
+    if args.cmd == "rotate":
+        for day, n in rotate().items():
+            print(f"  {day}: {n} rows → {partition_path(day).name}")
+    else:
+        for day in compact(args.older_than):
+            print(f"  {day}: compacted to Parquet")
@@ -0,0 +1,368 @@
+# src/pulsetransit/planner.py
+"""
+Journey planner over the local GTFS feed (Connection Scan Algorithm).
+
+Every pair of consecutive stops of a trip is a connection; `Timetable`
+keeps them in flat arrays sorted by departure time, and a query scans
+them once from the departure time onwards, stopping as soon as no later
+connection can improve the arrival at the destination. Walking
+transfers join stops within `MAX_WALK_M` of each other.
+
+    planner = get_timetable()
+    journey = planner.plan(origin, destination, datetime.now(TZ))
+    journey.to_frame()
+
+Stops without times in stop_times (non-timepoints) get times
+interpolated along their trip, so they can be boarded and alighted at.
+"""
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from pulsetransit.dashboard.schedules import (
+    SECONDS_PER_DAY,
+    ScheduleIndex,
+    get_schedule_index,
+    load_routes,
+    load_stop_times,
+    load_trips,
+    parse_gtfs_time_column,
+)
+from pulsetransit.gtfs_cache import GTFS_DIR, feed_hash, load_table
+from pulsetransit.spatial import StopIndex
+
+MAX_WALK_M = 400
+WALK_SPEED_MS = 1.2
+# Streets are not straight lines
+WALK_DETOUR = 1.3
+# Time to change buses at the same stop
+TRANSFER_S = 60
+MAX_JOURNEY_S = 3 * 3600
+
+_INF = 1 << 40
+
+
+@dataclass(frozen=True)
+class Leg:
+    mode: str                    # "bus" or "walk"
+    from_stop: int
+    to_stop: int
+    depart: int                  # seconds since the query day's midnight
+    arrive: int
+    route_short_name: str = ""
+    trip_headsign: str = ""
+
+
+@dataclass(frozen=True)
+class Journey:
+    legs: tuple[Leg, ...]
+
+    @property
+    def depart(self) -> int:
+        return self.legs[0].depart
+
+    @property
+    def arrive(self) -> int:
+        return self.legs[-1].arrive
+
+    @property
+    def transfers(self) -> int:
+        return max(sum(leg.mode == "bus" for leg in self.legs) - 1, 0)
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per leg with HH:MM times."""
+        return pd.DataFrame({
+            "mode": [leg.mode for leg in self.legs],
+            "route_short_name": [leg.route_short_name for leg in self.legs],
+            "trip_headsign": [leg.trip_headsign for leg in self.legs],
+            "from_stop": [leg.from_stop for leg in self.legs],
+            "to_stop": [leg.to_stop for leg in self.legs],
+            "depart": [format_seconds(leg.depart) for leg in self.legs],
+            "arrive": [format_seconds(leg.arrive) for leg in self.legs],
+        })
+
+
+def format_seconds(seconds: int) -> str:
+    """Seconds since midnight → 'HH:MM' (wrapping past 24:00)."""
+    return f"{seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}"
+
+
+@dataclass
+class Timetable:
+    """
+    Connections of a GTFS feed sorted by departure time, plus walking
+    transfers between nearby stops.
+
+    Stops are addressed by code (position in `stop_ids`) and trips by
+    code (position in the trip_* arrays). Service days come from the
+    schedule index's calendar.
+    """
+    stop_ids: np.ndarray
+    dep_stop: np.ndarray         # int32 stop codes, one per connection
+    arr_stop: np.ndarray
+    dep: np.ndarray              # int32 seconds since service-day start, sorted
+    arr: np.ndarray
+    trip: np.ndarray             # int32 trip code
+    trip_service: np.ndarray     # int32 code into `schedule.services`, -1 if unknown
+    trip_route: np.ndarray
+    trip_headsign: np.ndarray
+    footpaths: list[list[tuple[int, int]]]  # stop code → [(stop code, walk seconds)]
+    schedule: ScheduleIndex = field(repr=False)
+    code_of: dict[int, int] = field(default_factory=dict, repr=False)
+    _day_cache: dict[int, tuple] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self.code_of = {int(s): i for i, s in enumerate(self.stop_ids)}
+
+    def _active_trips(self, day: date) -> np.ndarray:
+        mask = self.schedule.active_mask(int(day.strftime("%Y%m%d")))
+        # The appended False is what code -1 (service not in the index) reads
+        return np.append(mask, False)[self.trip_service]
+
+    def day(self, day: date) -> tuple[np.ndarray, ...]:
+        """
+        (dep, arr, dep_stop, arr_stop, trip) of every connection running
+        on calendar day `day`, sorted by departure in seconds since that
+        day's midnight: the day's own trips plus yesterday's past 24:00:00.
+        Cached for a few days.
+        """
+        key = int(day.strftime("%Y%m%d"))
+        cached = self._day_cache.get(key)
+        if cached is None:
+            own = np.flatnonzero(self._active_trips(day)[self.trip])
+            carried = np.flatnonzero(
+                self._active_trips(day - timedelta(days=1))[self.trip]
+                & (self.dep >= SECONDS_PER_DAY)
+            )
+            rows = np.concatenate((own, carried))
+            dep = np.concatenate((self.dep[own], self.dep[carried] - SECONDS_PER_DAY))
+            order = np.argsort(dep, kind="stable")
+            rows = rows[order]
+            shift = np.where(order >= len(own), SECONDS_PER_DAY, 0)
+            cached = (
+                dep[order],
+                self.arr[rows] - shift,
+                self.dep_stop[rows],
+                self.arr_stop[rows],
+                self.trip[rows],
+            )
+            if len(self._day_cache) >= 3:
+                self._day_cache.clear()
+            self._day_cache[key] = cached
+        return cached
+
+    def plan(
+        self,
+        origin: int,
+        destination: int,
+        departure: datetime,
+        max_duration_s: int = MAX_JOURNEY_S,
+    ) -> Journey | None:
+        """
+        Earliest-arrival journey from stop `origin` to stop `destination`
+        leaving at or after `departure` (wall-clock local time), or None
+        if there is none within `max_duration_s`.
+        """
+        o = self.code_of.get(int(origin))
+        target = self.code_of.get(int(destination))
+        if o is None or target is None:
+            return None
+        t0 = departure.hour * 3600 + departure.minute * 60 + departure.second
+        if o == target:
+            return Journey((Leg("walk", int(origin), int(destination), t0, t0),))
+
+        dep, arr, dep_stop, arr_stop, trip = self.day(departure.date())
+        lo = int(np.searchsorted(dep, t0))
+        hi = int(np.searchsorted(dep, t0 + max_duration_s, side="right"))
+        # The scan is a tight Python loop: plain lists index much faster
+        # than numpy scalars
+        dep_l = dep[lo:hi].tolist()
+        arr_l = arr[lo:hi].tolist()
+        src_l = dep_stop[lo:hi].tolist()
+        dst_l = arr_stop[lo:hi].tolist()
+        trip_l = trip[lo:hi].tolist()
+
+        # Two labels per stop, since footpaths are not transitive: a walk
+        # can only start where a bus (or the journey) did
+        n_stops = len(self.stop_ids)
+        ride = [_INF] * n_stops          # earliest arrival by bus
+        walked = [_INF] * n_stops        # earliest arrival on foot
+        board = [_INF] * n_stops         # earliest time a bus can be boarded
+        via_bus: list[tuple | None] = [None] * n_stops    # (entry, exit) connections
+        via_walk: list[tuple | None] = [None] * n_stops   # (from stop, seconds)
+        walked[o] = board[o] = t0
+        for nb, walk in self.footpaths[o]:
+            walked[nb] = board[nb] = t0 + walk
+            via_walk[nb] = (o, walk)
+        best = walked[target]
+
+        entered: dict[int, int] = {}     # trip → connection it was boarded at
+        for i in range(len(dep_l)):
+            d = dep_l[i]
+            if d >= best:
+                break
+            tr = trip_l[i]
+            e = entered.get(tr)
+            if e is None:
+                if board[src_l[i]] > d:
+                    continue
+                entered[tr] = e = i
+            a = arr_l[i]
+            s = dst_l[i]
+            if a < ride[s]:
+                ride[s] = a
+                via_bus[s] = (e, i)
+                if a + TRANSFER_S < board[s]:
+                    board[s] = a + TRANSFER_S
+                for nb, walk in self.footpaths[s]:
+                    t = a + walk
+                    if t < walked[nb]:
+                        walked[nb] = t
+                        via_walk[nb] = (s, walk)
+                        if t < board[nb]:
+                            board[nb] = t
+                best = min(ride[target], walked[target])
+
+        if best >= _INF:
+            return None
+        legs = []
+        s = target
+        on_foot = walked[target] <= ride[target]
+        while not (s == o and on_foot):
+            if on_foot:
+                prev, walk = via_walk[s]
+                legs.append(Leg("walk", int(self.stop_ids[prev]), int(self.stop_ids[s]),
+                                walked[s] - walk, walked[s]))
+                s, on_foot = prev, prev == o
+            else:
+                e, i = via_bus[s]
+                legs.append(Leg(
+                    "bus", int(self.stop_ids[src_l[e]]), int(self.stop_ids[dst_l[i]]),
+                    dep_l[e], arr_l[i],
+                    str(self.trip_route[trip_l[i]]), str(self.trip_headsign[trip_l[i]]),
+                ))
+                s = src_l[e]
+                # Whichever label let us board in time
+                on_foot = walked[s] <= dep_l[e]
+        return Journey(tuple(legs[::-1]))
+
+
+def _interpolate_times(seconds: np.ndarray, trip_codes: np.ndarray) -> np.ndarray:
+    """
+    Fill missing times (-1) linearly between the known times around them
+    in the same trip; rows sorted by (trip, stop_sequence). Gaps at the
+    start or end of a trip stay -1.
+    """
+    missing = seconds < 0
+    if not missing.any():
+        return seconds
+    n = len(seconds)
+    idx = np.arange(n)
+    prev = np.maximum.accumulate(np.where(~missing, idx, -1))
+    nxt = np.minimum.accumulate(np.where(~missing, idx, n)[::-1])[::-1]
+    inside = missing & (prev >= 0) & (nxt < n)
+    inside[inside] &= (trip_codes[prev[inside]] == trip_codes[idx[inside]]) \
+        & (trip_codes[nxt[inside]] == trip_codes[idx[inside]])
+    out = seconds.astype(np.int64)
+    p, q, i = prev[inside], nxt[inside], idx[inside]
+    out[i] = out[p] + (out[q] - out[p]) * (i - p) // (q - p)
+    return out.astype(seconds.dtype)
+
+
+def build_footpaths(stops: pd.DataFrame, stop_ids: np.ndarray) -> list[list[tuple[int, int]]]:
+    """Walking links (stop code, seconds) between stops within `MAX_WALK_M`."""
+    code_of = {int(s): i for i, s in enumerate(stop_ids)}
+    index = StopIndex.from_stops(stops)
+    footpaths = []
+    for stop_id, lat, lon in zip(stops["stop_id"], stops["stop_lat"], stops["stop_lon"]):
+        ids, dist = index.within(lat, lon, MAX_WALK_M)
+        footpaths.append([
+            (code_of[int(i)], int(round(d * WALK_DETOUR / WALK_SPEED_MS)))
+            for i, d in zip(ids, dist) if int(i) != int(stop_id)
+        ])
+    return footpaths
+
+
+def build_timetable(schedule: ScheduleIndex | None = None) -> Timetable:
+    """Load the GTFS feed and build a `Timetable` (calendar from `schedule`)."""
+    schedule = schedule or get_schedule_index()
+    stops = load_table("stops")
+    stop_times = load_stop_times(categorical=True)[
+        ["trip_id", "arrival_time", "departure_time", "stop_id", "stop_sequence"]
+    ]
+    trips = load_trips().merge(load_routes()[["route_id", "route_short_name"]], on="route_id")
+
+    trip_codes, trip_ids = pd.factorize(stop_times["trip_id"])
+    order = np.lexsort((stop_times["stop_sequence"].to_numpy(), trip_codes))
+    trip_codes = trip_codes[order]
+    arrival = parse_gtfs_time_column(stop_times["arrival_time"])[order]
+    departure = parse_gtfs_time_column(stop_times["departure_time"])[order]
+    arrival = np.where(arrival >= 0, arrival, departure)
+    departure = np.where(departure >= 0, departure, arrival)
+    arrival = _interpolate_times(arrival, trip_codes)
+    departure = _interpolate_times(departure, trip_codes)
+
+    stop_ids = stops["stop_id"].to_numpy()
+    stop_codes = pd.Index(stop_ids).get_indexer(stop_times["stop_id"].to_numpy()[order])
+
+    # Connection i runs from row i to row i + 1 of the same trip
+    ok = (trip_codes[:-1] == trip_codes[1:]) & (departure[:-1] >= 0) & (arrival[1:] >= 0) \
+        & (stop_codes[:-1] >= 0) & (stop_codes[1:] >= 0)
+    first = np.flatnonzero(ok)
+    first = first[np.argsort(departure[first], kind="stable")]
+
+    trip_info = trips.set_index("trip_id").reindex(np.asarray(trip_ids, dtype=object))
+    service_code = {s: i for i, s in enumerate(schedule.services)}
+    return Timetable(
+        stop_ids=stop_ids,
+        dep_stop=stop_codes[first].astype(np.int32),
+        arr_stop=stop_codes[first + 1].astype(np.int32),
+        dep=departure[first].astype(np.int32),
+        arr=arrival[first + 1].astype(np.int32),
+        trip=trip_codes[first].astype(np.int32),
+        trip_service=np.array([service_code.get(s, -1) for s in trip_info["service_id"]],
+                              dtype=np.int32),
+        trip_route=trip_info["route_short_name"].astype(str).to_numpy(dtype=object),
+        trip_headsign=trip_info["trip_headsign"].to_numpy(dtype=object),
+        footpaths=build_footpaths(stops, stop_ids),
+        schedule=schedule,
+    )
+
+
+@lru_cache(maxsize=1)
+def _cached_timetable(gtfs_dir: Path, feed: str) -> Timetable:
+    return build_timetable()
+
+
+def get_timetable() -> Timetable:
+    """Process-wide `Timetable` for the current feed, rebuilt when the feed changes."""
+    return _cached_timetable(GTFS_DIR, feed_hash())
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from zoneinfo import ZoneInfo
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("origin", type=int)
+    parser.add_argument("destination", type=int)
+    parser.add_argument("--at", help="departure, e.g. '2025-12-17 08:30' (default: now)")
+    args = parser.parse_args()
+
+    when = (datetime.fromisoformat(args.at) if args.at
+            else datetime.now(ZoneInfo("Europe/Madrid")))
+    t0 = time.perf_counter()
+    timetable = get_timetable()
+    print(f"timetable: {len(timetable.dep)} connections ({time.perf_counter() - t0:.2f}s)")
+    t0 = time.perf_counter()
+    journey = timetable.plan(args.origin, args.destination, when)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if journey is None:
+        print(f"no journey ({elapsed:.1f} ms)")
+    else:
+        print(journey.to_frame().to_string(index=False))
+        print(f"arrive {format_seconds(journey.arrive)}, {journey.transfers} transfers "
+              f"({elapsed:.1f} ms)")
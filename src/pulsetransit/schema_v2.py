@@ -0,0 +1,318 @@
+# src/pulsetransit/schema_v2.py
+"""
+Compact v2 layout for estimaciones/posiciones.
+
+Timestamps are INTEGER epoch seconds (UTC) instead of ISO-8601 TEXT, and
+the repeated line/destination strings of estimaciones are stored once in
+lookup tables and referenced by id. Row ids are kept from the v1 tables.
+The `*_iso` views give back the v1 column layout for ad-hoc queries.
+
+    python -m pulsetransit.schema_v2 migrate   # data/tus.db → data/tus_v2.db
+    python -m pulsetransit.schema_v2 bench     # synthetic size/scan comparison
+"""
+import sqlite3
+import time
+from pathlib import Path
+
+from pulsetransit.db import DB_PATH, init_db
+
+DB_V2_PATH = DB_PATH.parent / "tus_v2.db"
+SCHEMA_VERSION = 2
+MIGRATE_BATCH = 100_000
+
+
+def _epoch(col):
+    # SQLite's date parser understands the API's ISO strings, with or
+    # without a UTC offset; unparseable values become NULL, which `migrate`
+    # catches by counting rows
+    return f"CAST(strftime('%s', {col}) AS INTEGER)"
+
+
+def _iso(col):
+    return f"strftime('%Y-%m-%dT%H:%M:%SZ', {col}, 'unixepoch')"
+
+
+def init_db_v2(conn):
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS lineas (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS destinos (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS estimaciones (
+            id INTEGER PRIMARY KEY,
+            collected_at INTEGER NOT NULL,
+            parada_id INTEGER,
+            linea_id INTEGER REFERENCES lineas(id),
+            fech_actual INTEGER,
+            tiempo1 INTEGER,
+            tiempo2 INTEGER,
+            distancia1 INTEGER,
+            distancia2 INTEGER,
+            destino1_id INTEGER REFERENCES destinos(id),
+            destino2_id INTEGER REFERENCES destinos(id),
+            predicted_arrival INTEGER,
+            UNIQUE(parada_id, linea_id, fech_actual)
+        );
+        CREATE TABLE IF NOT EXISTS posiciones (
+            id INTEGER PRIMARY KEY,
+            collected_at INTEGER NOT NULL,
+            instante INTEGER NOT NULL,
+            vehiculo INTEGER,
+            linea INTEGER,
+            lat REAL,
+            lon REAL,
+            velocidad INTEGER,
+            estado INTEGER,
+            UNIQUE(vehiculo, instante)
+        );
+        CREATE INDEX IF NOT EXISTS idx_est_collected ON estimaciones(collected_at);
+        CREATE INDEX IF NOT EXISTS idx_est_arrival ON estimaciones(predicted_arrival);
+        CREATE INDEX IF NOT EXISTS idx_pos_instant ON posiciones(instante);
+        CREATE INDEX IF NOT EXISTS idx_pos_vehiculo ON posiciones(vehiculo);
+
+        CREATE VIEW IF NOT EXISTS estimaciones_iso AS
+        SELECT e.id, {_iso("e.collected_at")} AS collected_at, e.parada_id,
+               l.name AS linea, {_iso("e.fech_actual")} AS fech_actual,
+               e.tiempo1, e.tiempo2, e.distancia1, e.distancia2,
+               d1.name AS destino1, d2.name AS destino2,
+               {_iso("e.predicted_arrival")} AS predicted_arrival
+        FROM estimaciones e
+        LEFT JOIN lineas l ON l.id = e.linea_id
+        LEFT JOIN destinos d1 ON d1.id = e.destino1_id
+        LEFT JOIN destinos d2 ON d2.id = e.destino2_id;
+
+        CREATE VIEW IF NOT EXISTS posiciones_iso AS
+        SELECT id, {_iso("collected_at")} AS collected_at, {_iso("instante")} AS instante,
+               vehiculo, linea, lat, lon, velocidad, estado
+        FROM posiciones;
+
+        PRAGMA user_version = {SCHEMA_VERSION};
+    """)
+    conn.commit()
+
+
+def connect_v2(path: Path = DB_V2_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+# Per table, the statements run for each id range; the last one copies the rows
+_MIGRATE_SQL = {
+    "estimaciones": [
+        """INSERT OR IGNORE INTO lineas (name)
+           SELECT DISTINCT linea FROM src.estimaciones
+           WHERE id > ? AND id <= ? AND linea IS NOT NULL""",
+        """INSERT OR IGNORE INTO destinos (name)
+           SELECT destino1 FROM src.estimaciones WHERE id > ?1 AND id <= ?2 AND destino1 IS NOT NULL
+           UNION
+           SELECT destino2 FROM src.estimaciones WHERE id > ?1 AND id <= ?2 AND destino2 IS NOT NULL""",
+        f"""INSERT OR IGNORE INTO estimaciones
+           (id, collected_at, parada_id, linea_id, fech_actual, tiempo1, tiempo2,
+            distancia1, distancia2, destino1_id, destino2_id, predicted_arrival)
+           SELECT e.id, {_epoch("e.collected_at")}, e.parada_id, l.id, {_epoch("e.fech_actual")},
+                  e.tiempo1, e.tiempo2, e.distancia1, e.distancia2, d1.id, d2.id,
+                  {_epoch("e.predicted_arrival")}
+           FROM src.estimaciones e
+           LEFT JOIN lineas l ON l.name = e.linea
+           LEFT JOIN destinos d1 ON d1.name = e.destino1
+           LEFT JOIN destinos d2 ON d2.name = e.destino2
+           WHERE e.id > ? AND e.id <= ?""",
+    ],
+    "posiciones": [
+        f"""INSERT OR IGNORE INTO posiciones
+           (id, collected_at, instante, vehiculo, linea, lat, lon, velocidad, estado)
+           SELECT id, {_epoch("collected_at")}, {_epoch("instante")}, vehiculo, linea,
+                  lat, lon, velocidad, estado
+           FROM src.posiciones
+           WHERE id > ? AND id <= ?""",
+    ],
+}
+
+
+def migrate(src_path: Path = DB_PATH, dst=None, batch_size: int = MIGRATE_BATCH) -> dict[str, int]:
+    """
+    Copy the v1 tables at `src_path` into a v2 database, `batch_size` ids at
+    a time. Returns rows migrated per table.
+
+    Each batch commits on its own and the copy resumes after the highest id
+    already present, so an interrupted migration can be rerun, and rerunning
+    later picks up rows collected since.
+
+    Raises RuntimeError, rolling back the batch, if a batch copies fewer
+    rows than the source holds: INSERT OR IGNORE would otherwise silently
+    drop rows whose timestamps do not parse (NULL into a NOT NULL column)
+    or collide once converted to epoch seconds.
+    """
+    own_conn = dst is None
+    dst = dst or connect_v2()
+    init_db_v2(dst)
+    dst.execute("ATTACH DATABASE ? AS src", (str(src_path),))
+    migrated = {}
+    try:
+        for table, statements in _MIGRATE_SQL.items():
+            start = dst.execute(f"SELECT COALESCE(MAX(id), 0) FROM main.{table}").fetchone()[0]
+            end = dst.execute(f"SELECT COALESCE(MAX(id), 0) FROM src.{table}").fetchone()[0]
+            before = dst.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0]
+            for lo in range(start, end, batch_size):
+                bounds = (lo, lo + batch_size)
+                with dst:
+                    for sql in statements[:-1]:
+                        dst.execute(sql, bounds)
+                    copied = dst.total_changes
+                    dst.execute(statements[-1], bounds)
+                    copied = dst.total_changes - copied
+                    expected = dst.execute(
+                        f"SELECT COUNT(*) FROM src.{table} WHERE id > ? AND id <= ?", bounds
+                    ).fetchone()[0]
+                    if copied != expected:
+                        raise RuntimeError(
+                            f"{table}: only {copied} of {expected} rows with ids {lo + 1}.."
+                            f"{lo + batch_size} copied; the rest have timestamps that do "
+                            f"not parse or collide as epoch seconds"
+                        )
+            migrated[table] = dst.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0] - before
+    finally:
+        dst.execute("DETACH DATABASE src")
+        if own_conn:
+            dst.close()
+    return migrated
+
+
+def _synthetic_v1(path: Path, days: int, rows_per_day: int, seed: int = 0):
+    """v1 database with `days` of estimaciones shaped like the real feed."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    lines = ["1", "2", "3", "4", "5C1", "5C2", "6C1", "6C2", "7C1", "7C2", "11", "12",
+             "13", "14", "16", "17", "18", "19", "20", "21", "23", "24C1", "24C2", "LC"]
+    dests = [f"{name} {suffix}" for name in ("Valdecilla", "Estaciones", "Sardinero",
+             "Cueto", "Monte", "Peñacastillo", "Corbán", "Campus", "Albericia", "Adarzo",
+             "Castilla-Hermida", "Cazoña") for suffix in ("Norte", "Sur", "Centro")]
+
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    start = pd.Timestamp("2026-01-01", tz="UTC").value // 10**9
+    per_pull = 5000
+    for day in range(days):
+        n = rows_per_day
+        collected = start + day * 86400 + np.sort(rng.integers(0, 86400 // 120, n)) * 120
+        fech = collected - rng.integers(0, 60, n)
+        t1 = rng.integers(0, 1800, n)
+        iso = lambda a: pd.to_datetime(a, unit="s", utc=True).strftime("%Y-%m-%dT%H:%M:%S+00:00")
+        frame = pd.DataFrame({
+            "collected_at": iso(collected),
+            "parada_id": rng.integers(1, 460, n),
+            "linea": rng.choice(lines, n),
+            "fech_actual": iso(fech),
+            "tiempo1": t1,
+            "tiempo2": t1 + rng.integers(300, 1200, n),
+            "distancia1": rng.integers(0, 8000, n),
+            "distancia2": rng.integers(0, 15000, n),
+            "destino1": rng.choice(dests, n),
+            "destino2": rng.choice(dests, n),
+            "predicted_arrival": iso(fech + t1),
+        })
+        for i in range(0, n, per_pull):
+            conn.executemany(
+                f"INSERT OR IGNORE INTO estimaciones ({', '.join(frame.columns)}) "
+                f"VALUES ({', '.join('?' * len(frame.columns))})",
+                frame.iloc[i:i + per_pull].itertuples(index=False),
+            )
+        conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def _mean_eta_v1(conn):
+    import pandas as pd
+    df = pd.read_sql_query("SELECT fech_actual, predicted_arrival FROM estimaciones", conn)
+    eta = pd.to_datetime(df["predicted_arrival"]) - pd.to_datetime(df["fech_actual"])
+    return eta.dt.total_seconds().mean()
+
+
+def _timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench(days: int = 90, rows_per_day: int = 20_000):
+    """Compare file size and scan speed of v1 and v2 on synthetic data."""
+    import tempfile
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        v1_path, v2_path = Path(tmp) / "v1.db", Path(tmp) / "v2.db"
+        t0 = time.perf_counter()
+        _synthetic_v1(v1_path, days, rows_per_day)
+        print(f"Synthetic v1: {days} days × {rows_per_day} rows ({time.perf_counter() - t0:.1f}s)")
+
+        v2 = sqlite3.connect(v2_path)
+        t0 = time.perf_counter()
+        migrated = migrate(v1_path, v2)
+        print(f"Migrated {migrated['estimaciones']} rows in {time.perf_counter() - t0:.1f}s")
+        v2.execute("VACUUM")
+        v1 = sqlite3.connect(v1_path)
+
+        last_week = pd.Timestamp("2026-01-01", tz="UTC") + pd.Timedelta(days=days - 7)
+        last_week_iso, last_week_epoch = last_week.isoformat(), last_week.value // 10**9
+        cases = {
+            "latest + count": (
+                lambda: v1.execute("SELECT COUNT(*), MAX(collected_at) FROM estimaciones").fetchone(),
+                lambda: v2.execute("SELECT COUNT(*), MAX(collected_at) FROM estimaciones").fetchone(),
+            ),
+            "last 7 days by line": (
+                lambda: v1.execute(
+                    "SELECT linea, COUNT(*) FROM estimaciones WHERE collected_at >= ? GROUP BY linea",
+                    (last_week_iso,)).fetchall(),
+                lambda: v2.execute(
+                    "SELECT l.name, n FROM (SELECT linea_id, COUNT(*) AS n FROM estimaciones "
+                    "WHERE collected_at >= ? GROUP BY linea_id) JOIN lineas l ON l.id = linea_id",
+                    (last_week_epoch,)).fetchall(),
+            ),
+            "mean ETA → pandas": (
+                lambda: _mean_eta_v1(v1),
+                lambda: pd.read_sql_query(
+                    "SELECT predicted_arrival - fech_actual AS eta FROM estimaciones", v2
+                )["eta"].mean(),
+            ),
+        }
+
+        size1, size2 = v1_path.stat().st_size, v2_path.stat().st_size
+        print(f"\n{'':<22}{'v1':>10}{'v2':>10}{'gain':>8}")
+        print(f"{'size (MiB)':<22}{size1 / 2**20:>10.1f}{size2 / 2**20:>10.1f}{size1 / size2:>7.1f}×")
+        for name, (f1, f2) in cases.items():
+            t1, t2 = _timed(f1), _timed(f2)
+            print(f"{name + ' (ms)':<22}{t1 * 1000:>10.1f}{t2 * 1000:>10.1f}{t1 / t2:>7.1f}×")
+        v1.close()
+        v2.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("migrate", help=f"copy {DB_PATH.name} into {DB_V2_PATH.name}")
+    p.add_argument("--batch-size", type=int, default=MIGRATE_BATCH)
+    p = sub.add_parser("bench", help="size and scan speed, v1 vs v2, on synthetic data")
+    p.add_argument("--days", type=int, default=90)
+    p.add_argument("--rows-per-day", type=int, default=20_000)
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        for table, n in migrate(batch_size=args.batch_size).items():
+            print(f"  {table}: {n} rows migrated")
+    else:
+        bench(args.days, args.rows_per_day)
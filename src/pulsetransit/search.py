@@ -0,0 +1,124 @@
+# src/pulsetransit/search.py
+"""
+Ranked stop search over names and IDs.
+
+Names are normalised (lowercase, accents and punctuation stripped) and
+split into tokens; a sorted token list answers prefix lookups by binary
+search, with a difflib fallback for typos. Numeric queries also match
+stop ID prefixes.
+"""
+import bisect
+import difflib
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+
+import pandas as pd
+
+from pulsetransit.gtfs_cache import feed_hash, load_table
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalise(text: str) -> str:
+    """'Peñacastillo (Avda.)' → 'penacastillo avda'."""
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(" ", ascii_only.lower()).strip()
+
+
+@dataclass(frozen=True)
+class StopMatch:
+    stop_id: int
+    stop_name: str
+    score: float
+
+    @property
+    def label(self) -> str:
+        return f"{self.stop_id} - {self.stop_name}"
+
+
+class StopSearchIndex:
+    """Prefix/fuzzy search over stop names plus ID-prefix search."""
+
+    def __init__(self, ids, names):
+        self.ids = [int(i) for i in ids]
+        self.names = [str(n) for n in names]
+        self._norm = [normalise(n) for n in self.names]
+        self._id_text = [str(i) for i in self.ids]
+
+        pairs = sorted(
+            (token, i) for i, name in enumerate(self._norm) for token in set(name.split())
+        )
+        self._tokens = [p[0] for p in pairs]
+        self._token_stops = [p[1] for p in pairs]
+        self._vocabulary = sorted(set(self._tokens))
+
+    @classmethod
+    def from_stops(cls, stops: pd.DataFrame) -> "StopSearchIndex":
+        return cls(stops["stop_id"], stops["stop_name"])
+
+    def _prefix(self, token: str) -> dict[int, float]:
+        """Stops with a name token starting with `token` → token score."""
+        hits = {}
+        lo = bisect.bisect_left(self._tokens, token)
+        hi = bisect.bisect_left(self._tokens, token + "\x7f")
+        for j in range(lo, hi):
+            i = self._token_stops[j]
+            score = 3.0 if self._tokens[j] == token else 2.0
+            hits[i] = max(hits.get(i, 0.0), score)
+        return hits
+
+    def _fuzzy(self, token: str) -> dict[int, float]:
+        hits = {}
+        for word in difflib.get_close_matches(token, self._vocabulary, n=5, cutoff=0.75):
+            for i in self._prefix(word):
+                hits[i] = 1.0
+        return hits
+
+    def search(self, query: str, limit: int = 10) -> list[StopMatch]:
+        """
+        Best matches for `query`, highest score first.
+
+        Every query token has to match a name token (by prefix, or fuzzily
+        if nothing has that prefix). Exact token matches beat prefixes,
+        which beat fuzzy matches; names that start with the query and
+        shorter names rank higher on ties. A numeric query also matches
+        IDs, exact ID first.
+        """
+        q = normalise(query)
+        if not q:
+            return []
+        scores: dict[int, float] = {}
+
+        if q.isdigit():
+            for i, id_text in enumerate(self._id_text):
+                if id_text.startswith(q):
+                    scores[i] = 100.0 if id_text == q else 50.0 - (len(id_text) - len(q))
+
+        name_scores = None
+        for token in q.split():
+            hits = self._prefix(token) or self._fuzzy(token)
+            if name_scores is None:
+                name_scores = hits
+            else:
+                name_scores = {i: s + hits[i] for i, s in name_scores.items() if i in hits}
+        for i, s in (name_scores or {}).items():
+            if self._norm[i].startswith(q):
+                s += 1.0
+            s -= len(self._norm[i]) / 1000  # shorter names first on ties
+            scores[i] = max(scores.get(i, 0.0), s)
+
+        best = sorted(scores, key=lambda i: (-scores[i], self.ids[i]))[:limit]
+        return [StopMatch(self.ids[i], self.names[i], round(scores[i], 3)) for i in best]
+
+
+@lru_cache(maxsize=1)
+def _cached_search_index(feed: str) -> StopSearchIndex:
+    return StopSearchIndex.from_stops(load_table("stops"))
+
+
+def get_stop_search_index() -> StopSearchIndex:
+    """Process-wide `StopSearchIndex` over the current feed's stops."""
+    return _cached_search_index(feed_hash())
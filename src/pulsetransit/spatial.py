@@ -0,0 +1,151 @@
+# src/pulsetransit/spatial.py
+"""
+Grid-hash spatial index over stops.
+
+Points are bucketed into square cells on a local equirectangular
+projection; queries only look at the cells around the query point and
+rank candidates by haversine distance. Used for map clicks in the
+dashboard and for matching GPS fixes (`posiciones`) to stops.
+"""
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+
+from pulsetransit.gtfs_cache import feed_hash, load_table
+
+EARTH_RADIUS_M = 6_371_000.0
+CELL_M = 250.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; broadcasts over arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class StopIndex:
+    """
+    Nearest-k and within-radius queries over a fixed set of points.
+
+    Build with `StopIndex.from_stops(stops)`; ids are returned as given
+    (stop_id for GTFS stops).
+    """
+
+    def __init__(self, ids, lats, lons, cell_m: float = CELL_M):
+        self.ids = np.asarray(ids)
+        self.lats = np.asarray(lats, dtype=float)
+        self.lons = np.asarray(lons, dtype=float)
+        self.cell_m = cell_m
+        self._lat0 = float(np.mean(self.lats)) if len(self.lats) else 0.0
+        self._m_per_deg_lat = EARTH_RADIUS_M * np.pi / 180
+        self._m_per_deg_lon = self._m_per_deg_lat * np.cos(np.radians(self._lat0))
+
+        cx, cy = self._cells(self.lats, self.lons)
+        order = np.lexsort((cy, cx))
+        self._order = order
+        keys = list(zip(cx[order].tolist(), cy[order].tolist()))
+        self._cells_index: dict[tuple[int, int], tuple[int, int]] = {}
+        start = 0
+        for i in range(1, len(keys) + 1):
+            if i == len(keys) or keys[i] != keys[start]:
+                self._cells_index[keys[start]] = (start, i)
+                start = i
+        if len(cx):
+            self._extent = (cx.min(), cx.max(), cy.min(), cy.max())
+        else:
+            self._extent = (0, -1, 0, -1)
+
+    @classmethod
+    def from_stops(cls, stops: pd.DataFrame, cell_m: float = CELL_M) -> "StopIndex":
+        return cls(stops["stop_id"].to_numpy(), stops["stop_lat"].to_numpy(),
+                   stops["stop_lon"].to_numpy(), cell_m)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cells(self, lats, lons):
+        cx = np.floor(np.asarray(lons) * self._m_per_deg_lon / self.cell_m).astype(np.int64)
+        cy = np.floor(np.asarray(lats) * self._m_per_deg_lat / self.cell_m).astype(np.int64)
+        return cx, cy
+
+    def _ring(self, cx, cy, r):
+        """Positions (into the id arrays) of points in the ring of cells at Chebyshev radius r."""
+        found = []
+        for x in range(cx - r, cx + r + 1):
+            for y in (range(cy - r, cy + r + 1) if abs(x - cx) == r else (cy - r, cy + r)):
+                span = self._cells_index.get((x, y))
+                if span:
+                    found.append(self._order[span[0]:span[1]])
+        return found
+
+    def _max_ring(self, cx, cy):
+        x0, x1, y0, y1 = self._extent
+        return int(max(cx - x0, x1 - cx, cy - y0, y1 - cy, 0))
+
+    def _worth_scanning(self, r):
+        # Past this many cells (e.g. a query far outside the network), a
+        # brute-force pass over all points is cheaper than walking rings
+        return (2 * r + 1) ** 2 <= 4 * len(self) + 9
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """The `k` closest points as (ids, distances in metres), closest first."""
+        k = min(k, len(self))
+        if k == 0:
+            return self.ids[:0], np.empty(0)
+        cx, cy = (int(c[0]) for c in self._cells([lat], [lon]))
+        candidates = []
+        best = None
+        r, r_max = 0, self._max_ring(cx, cy)
+        while r <= r_max:
+            if not self._worth_scanning(r):
+                candidates = [np.arange(len(self))]
+                break
+            candidates += self._ring(cx, cy, r)
+            n = sum(len(c) for c in candidates)
+            if n >= k:
+                pos = np.concatenate(candidates)
+                dist = haversine_m(lat, lon, self.lats[pos], self.lons[pos])
+                kth = np.partition(dist, k - 1)[k - 1]
+                # Anything outside the rings scanned so far is at least
+                # r cells away, so stop once the k-th distance is within that
+                if kth <= r * self.cell_m:
+                    best = (pos, dist)
+                    break
+            r += 1
+        if best is None:
+            pos = np.concatenate(candidates)
+            best = (pos, haversine_m(lat, lon, self.lats[pos], self.lons[pos]))
+        pos, dist = best
+        top = np.argsort(dist, kind="stable")[:k]
+        return self.ids[pos[top]], dist[top]
+
+    def within(self, lat: float, lon: float, radius_m: float) -> tuple[np.ndarray, np.ndarray]:
+        """All points within `radius_m` as (ids, distances in metres), closest first."""
+        cx, cy = (int(c[0]) for c in self._cells([lat], [lon]))
+        reach = int(np.ceil(radius_m / self.cell_m))
+        candidates = []
+        for r in range(min(reach, self._max_ring(cx, cy)) + 1):
+            if not self._worth_scanning(r):
+                candidates = [np.arange(len(self))]
+                break
+            candidates += self._ring(cx, cy, r)
+        if not candidates:
+            return self.ids[:0], np.empty(0)
+        pos = np.concatenate(candidates)
+        dist = haversine_m(lat, lon, self.lats[pos], self.lons[pos])
+        inside = dist <= radius_m
+        pos, dist = pos[inside], dist[inside]
+        order = np.argsort(dist, kind="stable")
+        return self.ids[pos[order]], dist[order]
+
+
+@lru_cache(maxsize=1)
+def _cached_stop_index(feed: str) -> StopIndex:
+    return StopIndex.from_stops(load_table("stops"))
+
+
+def get_stop_index() -> StopIndex:
+    """Process-wide `StopIndex` over the current feed's stops."""
+    return _cached_stop_index(feed_hash())
@@ -0,0 +1,173 @@
+# src/pulsetransit/sync.py
+"""
+Incremental D1 → local SQLite sync.
+
+Production rows are written by the Cloudflare worker into D1. This pulls
+only rows whose D1 `id` is above a per-table high-water mark, in pages,
+and bulk-loads them into `data/tus.db` with the collector's INSERT OR
+IGNORE statements. Local ids are independent of D1's, so the marks live
+in a `sync_state` table; each page and its new mark commit together,
+which makes an interrupted sync safe to rerun.
+
+    CLOUDFLARE_ACCOUNT_ID=... CLOUDFLARE_API_TOKEN=... python -m pulsetransit.sync
+    python -m pulsetransit.sync --source export.sql   # wrangler d1 export, or a .db copy
+"""
+import json
+import os
+import sqlite3
+import time
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pulsetransit.collector import ESTIMACIONES_SQL, POSICIONES_SQL
+from pulsetransit.db import count_inserted, get_connection, init_db, record_ingest
+
+D1_DATABASE_ID = "14eda04e-aa18-4fb4-a6cb-b3ca5c333cb9"  # pulsetransit-db, see wrangler.jsonc
+PAGE_SIZE = 5000
+
+# Columns in the order the collector's INSERT statements expect
+TABLES = {
+    "estimaciones": (
+        ESTIMACIONES_SQL,
+        ["collected_at", "parada_id", "linea", "fech_actual", "tiempo1", "tiempo2",
+         "distancia1", "distancia2", "destino1", "destino2", "predicted_arrival"],
+    ),
+    "posiciones": (
+        POSICIONES_SQL,
+        ["collected_at", "instante", "vehiculo", "linea", "lat", "lon", "velocidad", "estado"],
+    ),
+}
+
+
+class D1Source:
+    """Reads pages through the Cloudflare D1 HTTP query API."""
+
+    def __init__(self, account_id, api_token, database_id=D1_DATABASE_ID, timeout=60):
+        self.url = (f"https://api.cloudflare.com/client/v4/accounts/{account_id}"
+                    f"/d1/database/{database_id}/query")
+        self.api_token = api_token
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls):
+        try:
+            return cls(os.environ["CLOUDFLARE_ACCOUNT_ID"], os.environ["CLOUDFLARE_API_TOKEN"],
+                       os.environ.get("D1_DATABASE_ID", D1_DATABASE_ID))
+        except KeyError as e:
+            raise SystemExit(f"Missing environment variable {e.args[0]}")
+
+    def query(self, sql, params):
+        req = urllib.request.Request(
+            self.url,
+            data=json.dumps({"sql": sql, "params": params}).encode(),
+            headers={"Authorization": f"Bearer {self.api_token}",
+                     "Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as r:
+            body = json.loads(r.read())
+        if not body.get("success"):
+            raise RuntimeError(f"D1 query failed: {body.get('errors')}")
+        return body["result"][0]["results"]
+
+
+class SQLiteSource:
+    """
+    Local stand-in for D1: a SQLite database file, or a `.sql` dump such as
+    `wrangler d1 export` produces (loaded into memory).
+    """
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        if path.suffix == ".sql":
+            self.conn = sqlite3.connect(":memory:")
+            self.conn.executescript(path.read_text(encoding="utf-8"))
+        else:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.conn.row_factory = sqlite3.Row
+
+    def query(self, sql, params):
+        return [dict(r) for r in self.conn.execute(sql, params)]
+
+
+def init_sync_state(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            table_name TEXT PRIMARY KEY,
+            high_water INTEGER NOT NULL,
+            synced_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+
+def high_water(conn, table):
+    row = conn.execute(
+        "SELECT high_water FROM sync_state WHERE table_name = ?", (table,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def sync_table(conn, source, table, page_size=PAGE_SIZE):
+    """
+    Copy rows of `table` with id above the stored mark from `source`.
+    Returns (rows fetched, rows inserted).
+    """
+    sql, columns = TABLES[table]
+    select = (f"SELECT id, {', '.join(columns)} FROM {table} "
+              f"WHERE id > ? ORDER BY id LIMIT ?")
+    mark = high_water(conn, table)
+    fetched = inserted = 0
+    while True:
+        page = source.query(select, [mark, page_size])
+        if not page:
+            break
+        mark = page[-1]["id"]
+        rows = [tuple(r[c] for c in columns) for r in page]
+        # The page and its mark commit together, so a crash can't record a
+        # page that wasn't stored
+        with conn:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            page_inserted = conn.total_changes - before
+            count_inserted(conn, table, page_inserted)
+            inserted += page_inserted
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                (table, mark, datetime.now(timezone.utc).isoformat()),
+            )
+        fetched += len(rows)
+        if len(page) < page_size:
+            break
+    return fetched, inserted
+
+
+def sync(source, conn=None, page_size=PAGE_SIZE):
+    own_conn = conn is None
+    conn = conn or get_connection()
+    init_db(conn)
+    init_sync_state(conn)
+    try:
+        for table in TABLES:
+            t0 = time.perf_counter()
+            fetched, inserted = sync_table(conn, source, table, page_size)
+            record_ingest(conn, table, inserted, time.perf_counter() - t0,
+                          datetime.now(timezone.utc).isoformat())
+            print(f"  {table}: {inserted} new rows from {fetched} fetched "
+                  f"(high-water id {high_water(conn, table)}, {time.perf_counter() - t0:.1f}s)")
+    finally:
+        if own_conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--source", type=Path,
+                        help="SQLite file or .sql dump to read instead of the D1 API")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    source = SQLiteSource(args.source) if args.source else D1Source.from_env()
+    print(f"Syncing from {args.source or 'D1'}")
+    sync(source, page_size=args.page_size)
@@ -6,9 +6,7 @@ from pathlib import Path
 DB_PATH = Path(__file__).parent.parent.parent / "data" / "tus.db"
 MAX_AGE_HOURS = 2  # fail if no data collected in last 2 hours
 
-def check_table(conn, table, time_col):
-    row = conn.execute(f"SELECT COUNT(*), MAX({time_col}) FROM {table}").fetchone()
-    count, latest = row[0], row[1]
+def report(table, count, latest):
     if not latest:
         print(f"  FAIL — {table}: no data at all")
         return False
@@ -20,16 +18,44 @@ def check_table(conn, table, time_col):
     print(f"  {status} — {table}: {count} rows, latest {latest_dt.strftime('%H:%M UTC')} ({age.seconds//60} min ago)")
     return ok
 
-conn = sqlite3.connect(DB_PATH)
-print(f"Validating at {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}")
-results = [
-    check_table(conn, "estimaciones", "collected_at"),
-    check_table(conn, "posiciones",   "instante"),
-]
-conn.close()
+def check_table(conn, table, time_col):
+    """Full audit: scans the whole table. Use offline or with --audit."""
+    row = conn.execute(f"SELECT COUNT(*), MAX({time_col}) FROM {table}").fetchone()
+    return report(table, row[0], row[1])
+
+def check_meta(conn, table, time_col):
+    """O(1) check against the collector-maintained ingest_meta row."""
+    try:
+        row = conn.execute(
+            "SELECT row_count, last_time, last_run_at, last_run_ms FROM ingest_meta WHERE dataset = ?",
+            (table,),
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row is None:
+        # Database predates ingest_meta
+        return check_table(conn, table, time_col)
+    count, latest, last_run_at, last_run_ms = row
+    ok = report(table, count, latest)
+    if last_run_at:
+        print(f"       last run {last_run_at[:16]}Z took {last_run_ms or 0:.0f} ms")
+    return ok
+
+if __name__ == "__main__":
+    audit = "--audit" in sys.argv[1:]
+    check = check_table if audit else check_meta
+
+    conn = sqlite3.connect(DB_PATH)
+    print(f"Validating at {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}"
+          + (" (full audit)" if audit else ""))
+    results = [
+        check(conn, "estimaciones", "collected_at"),
+        check(conn, "posiciones",   "instante"),
+    ]
+    conn.close()
 
-if not all(results):
-    print("Validation FAILED")
-    sys.exit(1)
+    if not all(results):
+        print("Validation FAILED")
+        sys.exit(1)
 
-print("Validation PASSED")
+    print("Validation PASSED")
@@ -0,0 +1,52 @@
+"""
+Synthetic GTFS feeds for the tests.
+
+The published feed in data/gtfs-static ships without stop_times.txt, so
+these feeds take its stops, shapes and routes and add stop_times from the
+benchmark suite's `synthetic_stop_times`. GTFS_DIR and the binary cache
+are relative to the working directory, so a test runs inside the feed's
+root (`in_feed`).
+"""
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from suite import synthetic_stop_times
+
+REPO_FEED = Path(__file__).resolve().parent.parent / "data" / "gtfs-static"
+
+
+def write_feed(root: Path, trips: pd.DataFrame, calendar_dates: pd.DataFrame) -> Path:
+    """GTFS feed under `root`/data/gtfs-static with synthetic stop_times."""
+    feed = root / "data" / "gtfs-static"
+    feed.mkdir(parents=True)
+    for name in ("agency", "calendar", "routes", "shapes", "stops"):
+        shutil.copy2(REPO_FEED / f"{name}.txt", feed)
+    trips.to_csv(feed / "trips.txt", index=False)
+    calendar_dates.to_csv(feed / "calendar_dates.txt", index=False)
+    synthetic_stop_times(feed).to_csv(feed / "stop_times.txt", index=False)
+    return root
+
+
+@contextmanager
+def in_feed(root: Path):
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def full_feed(tmp_path_factory) -> Path:
+    """The published feed's trips and calendar, with synthetic stop_times."""
+    return write_feed(
+        tmp_path_factory.mktemp("full"),
+        pd.read_csv(REPO_FEED / "trips.txt", dtype=str),
+        pd.read_csv(REPO_FEED / "calendar_dates.txt", dtype=str),
+    )
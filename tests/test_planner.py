@@ -0,0 +1,131 @@
+import heapq
+import random
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+
+from conftest import in_feed
+from pulsetransit.planner import MAX_JOURNEY_S, TRANSFER_S, build_timetable
+from pulsetransit.dashboard.schedules import build_schedule_index
+
+QUERIES = 60
+
+
+class Reference:
+    """
+    Earliest arrival by time-dependent Dijkstra over the same connections
+    and footpaths as the planner, with the same rules: staying on a trip
+    is free, changing buses at a stop costs TRANSFER_S, and a walk can
+    only start at the origin or where a bus was left.
+    """
+
+    def __init__(self, timetable, day):
+        self.timetable = timetable
+        self.dep, self.arr, dep_stop, self.arr_stop, self.trip = (
+            a.tolist() for a in timetable.day(day)
+        )
+        self.by_trip = defaultdict(list)      # trip → connections in order
+        self.position = []                    # connection → index in its trip
+        self.by_stop = defaultdict(list)      # stop → connections leaving it, by time
+        for i, (tr, s) in enumerate(zip(self.trip, dep_stop)):
+            self.position.append(len(self.by_trip[tr]))
+            self.by_trip[tr].append(i)
+            self.by_stop[s].append(i)
+
+    def earliest_arrival(self, origin, destination, when):
+        tt = self.timetable
+        o, target = tt.code_of[origin], tt.code_of[destination]
+        t0 = when.hour * 3600 + when.minute * 60 + when.second
+        last = t0 + MAX_JOURNEY_S
+        labels = {}                           # (stop, "ride" | "walk") → time
+        heap = []
+
+        def reach(t, s, mode):
+            if t < labels.get((s, mode), float("inf")):
+                labels[s, mode] = t
+                heapq.heappush(heap, (t, s, mode))
+
+        reach(t0, o, "walk")
+        for nb, walk in tt.footpaths[o]:
+            reach(t0 + walk, nb, "walk")
+        boarded = {}                          # trip → earliest position boarded
+        while heap:
+            t, s, mode = heapq.heappop(heap)
+            if labels[s, mode] != t:
+                continue
+            if s == target:
+                return t
+            board = t
+            if mode == "ride":
+                board += TRANSFER_S
+                for nb, walk in tt.footpaths[s]:
+                    reach(t + walk, nb, "walk")
+            leaving = self.by_stop[s]
+            start = bisect_left([self.dep[i] for i in leaving], board)
+            for i in leaving[start:]:
+                if self.dep[i] > last:
+                    break
+                tr, pos = self.trip[i], self.position[i]
+                until = boarded.get(tr, len(self.by_trip[tr]))
+                if pos >= until:
+                    continue
+                boarded[tr] = pos
+                for j in self.by_trip[tr][pos:until]:
+                    if self.dep[j] > last:
+                        break
+                    reach(self.arr[j], self.arr_stop[j], "ride")
+        return None
+
+
+@pytest.fixture(scope="module")
+def timetable(full_feed):
+    with in_feed(full_feed):
+        yield build_timetable(build_schedule_index())
+
+
+def _busiest_day(timetable) -> datetime:
+    dates = timetable.schedule.active_by_date
+    return datetime.strptime(str(max(dates, key=lambda d: len(dates[d]))), "%Y%m%d")
+
+
+def test_plan_matches_reference_earliest_arrival(timetable):
+    day = _busiest_day(timetable)
+    reference = Reference(timetable, day.date())
+    rng = random.Random(0)
+    served = sorted({int(timetable.stop_ids[s]) for s in set(timetable.dep_stop.tolist())})
+    found = 0
+    for _ in range(QUERIES):
+        origin, destination = rng.sample(served, 2)
+        when = day.replace(hour=rng.randint(5, 23), minute=rng.randint(0, 59))
+        journey = timetable.plan(origin, destination, when)
+        expected = reference.earliest_arrival(origin, destination, when)
+        if expected is None:
+            assert journey is None, (origin, destination, when)
+            continue
+        found += 1
+        assert journey is not None, (origin, destination, when)
+        assert journey.arrive == expected, (origin, destination, when)
+    assert found >= QUERIES // 2
+
+
+def test_plan_legs_are_connected(timetable):
+    day = _busiest_day(timetable)
+    rng = random.Random(1)
+    served = sorted({int(timetable.stop_ids[s]) for s in set(timetable.dep_stop.tolist())})
+    for _ in range(20):
+        origin, destination = rng.sample(served, 2)
+        when = day.replace(hour=rng.randint(6, 20))
+        journey = timetable.plan(origin, destination, when)
+        if journey is None:
+            continue
+        t0 = when.hour * 3600
+        assert journey.legs[0].from_stop == origin
+        assert journey.legs[-1].to_stop == destination
+        assert journey.depart >= t0
+        for before, after in zip(journey.legs, journey.legs[1:]):
+            assert after.from_stop == before.to_stop
+            assert after.depart >= before.arrive
+            if before.mode == after.mode == "bus":
+                assert after.depart >= before.arrive + TRANSFER_S
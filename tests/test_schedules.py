@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import in_feed, write_feed
+from pulsetransit.dashboard.schedules import (
+    build_schedule_index,
+    load_stop_times,
+    parse_gtfs_time_column,
+    parse_gtfs_times,
+)
+
+# 37 trips of one service are spread 30 minutes apart from 06:00, so the
+# last one starts at 24:00:00 and the one before it crosses midnight
+TRIPS = 37
+MONDAY, TUESDAY, WEDNESDAY = 20260105, 20260106, 20260107
+
+
+def test_parse_past_midnight_and_short_hours():
+    times = parse_gtfs_times(["24:05:00", "25:59:59", "5:04:03", "00:00:00", " 7:30:00"])
+    assert times.tolist() == [86_700, 93_599, 18_243, 0, 27_000]
+    assert times.dtype == np.int32
+
+
+def test_parse_missing_is_minus_one():
+    assert parse_gtfs_times(["", None, np.nan, "08:00:00"]).tolist() == [-1, -1, -1, 28_800]
+
+
+@pytest.mark.parametrize("value", ["12:3:00", "ab:cd:ef", "123:00:00", "12-30-00", "1:2"])
+def test_parse_malformed_raises(value):
+    with pytest.raises(ValueError, match="malformed GTFS time"):
+        parse_gtfs_times(["08:00:00", value])
+
+
+def test_categorical_column_matches_plain():
+    values = ["24:05:00", "", "5:04:03", "24:05:00", None, "23:59:59"]
+    plain = parse_gtfs_times(values)
+    categorical = parse_gtfs_time_column(pd.Series(values, dtype="category"))
+    assert categorical.tolist() == plain.tolist()
+
+
+@pytest.fixture(scope="module")
+def overnight_feed(tmp_path_factory):
+    """One route's trips running only on Monday, the last ones past 24:00."""
+    trips = pd.DataFrame({
+        "route_id": "1",
+        "service_id": "MONDAY",
+        "trip_id": [f"t{i:02d}" for i in range(TRIPS)],
+        "trip_headsign": [f"T{i:02d}" for i in range(TRIPS)],
+        "direction_id": "0",
+        "block_id": "",
+        "shape_id": "Route_374",
+    })
+    calendar_dates = pd.DataFrame(
+        {"service_id": ["MONDAY"], "date": [MONDAY], "exception_type": [1]}
+    )
+    root = write_feed(tmp_path_factory.mktemp("overnight"), trips, calendar_dates)
+    with in_feed(root):
+        stop_times = load_stop_times()
+        yield build_schedule_index(), stop_times
+
+
+def _last_trip_stop(stop_times):
+    """The sixth stop of the trip that starts at 24:00:00."""
+    last = stop_times[stop_times["trip_id"] == f"t{TRIPS - 1:02d}"]
+    assert last["departure_time"].iloc[0] == "24:00:00"
+    return int(last["stop_id"].iloc[5])
+
+
+def test_after_midnight_includes_yesterdays_late_trips(overnight_feed):
+    index, stop_times = overnight_feed
+    stop_id = _last_trip_stop(stop_times)
+    at_stop = stop_times[stop_times["stop_id"] == stop_id]
+    seconds = parse_gtfs_times(at_stop["departure_time"])
+    reference = 5 * 60
+    expected = np.sort(seconds[seconds >= 86_400 + reference])[:10]
+    assert len(expected)
+
+    # Tuesday 00:05: Monday's service is still running its 24:xx trips
+    board = index.next_departures(stop_id, datetime(2026, 1, 6, 0, 5), limit=10)
+    assert parse_gtfs_times(board["departure_time"]).tolist() == expected.tolist()
+    assert board["minutes_until"].tolist() == ((expected - 86_400 - reference) // 60).tolist()
+    assert (board["route_short_name"] == "1").all()
+
+
+def test_after_midnight_respects_yesterdays_calendar(overnight_feed):
+    index, stop_times = overnight_feed
+    stop_id = _last_trip_stop(stop_times)
+    # Wednesday 00:05: the service did not run on Tuesday, nor runs today
+    board = index.next_departures(stop_id, datetime(2026, 1, 7, 0, 5), limit=10)
+    assert board.empty
+    # Monday 00:05: Sunday had no service, so the first bus is Monday's 06:xx
+    board = index.next_departures(stop_id, datetime(2026, 1, 5, 0, 5), limit=10)
+    assert len(board) == 10
+    assert not board["departure_time"].str.startswith(("24", "25")).any()
+    assert board["departure_time"].iloc[0] < "07:00:00"